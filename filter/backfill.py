@@ -0,0 +1,141 @@
+import re
+import threading
+import time
+from collections import deque
+
+import sublime
+from util import main_thread
+from filter.context import FilterContext
+from filter.record import RecordAssembler
+
+# Matches the timestamp prefix SerialMonitor adds to each line when timestamp logging is enabled
+_timestamp_prefix = re.compile(r"^\[(\d\d-\d\d-\d\d \d\d:\d\d:\d\d)\.(\d{3})\] ")
+
+
+def _line_time(line):
+    """
+    Gets the time a line was received from its timestamp prefix
+
+    :return: the time in seconds since the epoch, or None if the line has no timestamp
+    """
+    match = _timestamp_prefix.match(line)
+    if not match:
+        return None
+    return time.mktime(time.strptime(match.group(1), "%m-%d-%y %H:%M:%S")) + int(match.group(2)) / 1000.0
+
+
+class FilterBackfill(threading.Thread):
+    """
+    Thread that scans text already in a serial output view and writes the lines matching a filter into
+    the filter's view.  The view is read in chunks so neither the UI nor the live serial traffic is blocked.
+
+    The idle gap of record rules is measured with the timestamps of the lines.  Output received without timestamp
+    logging has no times, so records are only split by their start, end and max_lines rules there
+    """
+    CHUNK_SIZE = 64 * 1024
+    PROGRESS_INTERVAL = 0.5
+
+    def __init__(self, filter_args, source_view, on_complete=None):
+        """
+        :param filter_args: the filter to back-fill
+        :type filter_args: filter.manager._FilterArgs
+        :param source_view: the view containing the existing serial output
+        :type source_view: sublime.View
+        :param on_complete: optional function to call once the scan has finished or was cancelled
+        """
+        super(FilterBackfill, self).__init__(name="Backfill-{}".format(filter_args.filter_file.name))
+        self.daemon = True
+        self.filter_args = filter_args
+        self.source_view = source_view
+        self.on_complete = on_complete
+        self.cancelled = False
+        self.end = None
+
+    def schedule(self):
+        """
+        Starts the scan from the main thread, after the writes to the source view that are already queued.
+        Call it when the filter starts getting the live output: the text written to the view before that point
+        is back-filled, the text after it is filtered live
+        """
+        main_thread(self._start)
+
+    def _start(self):
+        # Only scan up to the start of the last (incomplete) line.  The rest of that line is still held
+        # by the FilterManager and will be filtered when the remainder of the line is received
+        self.end = self.source_view.line(self.source_view.size()).begin()
+        self.start()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        try:
+            self._scan()
+        finally:
+            if self.on_complete:
+                self.on_complete(self)
+
+    def _scan(self):
+        name = self.filter_args.filter_file.name
+        start_time = time.time()
+        last_progress = start_time
+        num_lines = 0
+        incomplete_line = ""
+        filter_file = self.filter_args.filter_file
+        context = FilterContext(filter_file.before, filter_file.after)
+        history = deque(maxlen=filter_file.before)
+        record = RecordAssembler(filter_file.record) if filter_file.record else None
+        position = 0
+
+        while position < self.end and not self.cancelled:
+            if not self.source_view.is_valid() or not self.filter_args.view.is_valid():
+                return
+
+            chunk_end = min(position + self.CHUNK_SIZE, self.end)
+            lines = self.source_view.substr(sublime.Region(position, chunk_end)).splitlines(True)
+            position = chunk_end
+            if not lines:
+                continue
+
+            lines[0] = incomplete_line + lines[0]
+            incomplete_line = ""
+            if not lines[-1].endswith("\n"):
+                incomplete_line = lines.pop()
+
+            matches = []
+            for line in lines:
+                if record:
+                    records = record.add_line(_timestamp_prefix.sub("", line, 1), line, _line_time(line))
+                    matches.extend(r_text for r_line, r_text in records if filter_file.check_filters(r_line))
+                else:
+                    matches.extend(context.select(num_lines, line, self._matches(line), history))
+                    history.append((num_lines, line))
+                num_lines += 1
+            if matches:
+                self.filter_args.write_backfill("".join(matches))
+
+            now = time.time()
+            if now - last_progress >= self.PROGRESS_INTERVAL:
+                last_progress = now
+                self._show_progress(name, num_lines, now - start_time)
+
+            # Give up the GIL between chunks so the reader thread and the UI keep running
+            time.sleep(0)
+
+        if record and not self.cancelled:
+            remaining = record.flush()
+            if remaining and filter_file.check_filters(remaining[0]):
+                self.filter_args.write_backfill(remaining[1])
+
+        if not self.cancelled:
+            self._show_progress(name, num_lines, time.time() - start_time, done=True)
+
+    def _matches(self, line):
+        return self.filter_args.filter_file.check_filters(_timestamp_prefix.sub("", line, 1))
+
+    @staticmethod
+    def _show_progress(name, num_lines, elapsed, done=False):
+        rate = num_lines / elapsed if elapsed > 0 else 0
+        msg = "Back-filling filter '{}': {} lines ({:.0f} lines/s){}".format(name, num_lines, rate,
+                                                                            ", done" if done else "")
+        main_thread(sublime.status_message, msg)
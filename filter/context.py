@@ -0,0 +1,59 @@
+class FilterContext(object):
+    """
+    Tracks the context lines (like grep -B/-A) that need to be written around the matches of a filter
+    """
+    SEPARATOR = "--\n"
+
+    def __init__(self, before=0, after=0):
+        """
+        :param before: number of lines to write before each match
+        :type before: int
+        :param after: number of lines to write after each match
+        :type after: int
+        """
+        self.before = before
+        self.after = after
+        self._after_remaining = 0
+        self._last_written = -1
+
+    def select(self, index, text, matched, history):
+        """
+        Gets the text to write for the given line
+
+        :param index: the running index of the line
+        :type index: int
+        :param text: the line of text
+        :type text: str
+        :param matched: whether the line satisfied the filter
+        :type matched: bool
+        :param history: the most recent lines before this one as (index, text) tuples, oldest first
+        :type history: collections.deque
+
+        :return: the lines to write to the filter output, which may be empty
+        :rtype: list of str
+        """
+        if matched:
+            lines = []
+            if self.before:
+                first = max(index - self.before, self._last_written + 1)
+                for i, t in reversed(history):
+                    if i < first:
+                        break
+                    lines.append((i, t))
+                lines.reverse()
+            first_index = lines[0][0] if lines else index
+            output = [t for _, t in lines]
+            output.append(text)
+
+            # Separate groups of lines that are not contiguous, same as grep
+            if (self.before or self.after) and 0 <= self._last_written < first_index - 1:
+                output.insert(0, self.SEPARATOR)
+            self._after_remaining = self.after
+        elif self._after_remaining > 0:
+            self._after_remaining -= 1
+            output = [text]
+        else:
+            return []
+
+        self._last_written = index
+        return output
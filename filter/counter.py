@@ -0,0 +1,80 @@
+from collections import deque
+
+
+class _PatternCount(object):
+    def __init__(self, label):
+        self.label = label
+        self.total = 0
+        # (second, count) buckets for the rolling window, oldest first
+        self._buckets = deque()
+        self._window_count = 0
+
+    def add(self, second, window):
+        self.total += 1
+        if self._buckets and self._buckets[-1][0] == second:
+            self._buckets[-1][1] += 1
+        else:
+            self._buckets.append([second, 1])
+        self._window_count += 1
+        self.expire(second, window)
+
+    def expire(self, second, window):
+        while self._buckets and self._buckets[0][0] <= second - window:
+            self._window_count -= self._buckets.popleft()[1]
+
+    def rate(self, window):
+        return self._window_count / float(window)
+
+
+class FilterCounter(object):
+    """
+    Counts the matches of each pattern in a filter file instead of writing the matching lines to a view.
+    Keeps the total count and the rate over a rolling window for each pattern.
+    For exclude filters the lines the filter would show, the ones matching none of the patterns, are counted
+    """
+    DEFAULT_WINDOW = 10
+    EXCLUDE_LABEL = "other lines"
+
+    def __init__(self, filter_file, window=DEFAULT_WINDOW):
+        """
+        :type filter_file: serial_filter.FilterFile
+        :param window: length of the rolling window for the rate, in seconds
+        :type window: int
+        """
+        self.filter_file = filter_file
+        self.window = window
+        if filter_file.exclude:
+            self._counts = [_PatternCount(self.EXCLUDE_LABEL)]
+        else:
+            self._counts = [_PatternCount(f.filter_text) for f in filter_file.filter_list]
+
+    def count(self, line, now):
+        """
+        Counts the matches of the line against each pattern
+
+        :param line: the line to check
+        :type line: str
+        :param now: the time the line was received
+        :type now: float
+        """
+        second = int(now)
+        if self.filter_file.exclude:
+            if self.filter_file.check_filters(line):
+                self._counts[0].add(second, self.window)
+            return
+        for f, pattern_count in zip(self.filter_file.filter_list, self._counts):
+            if f.matches(line):
+                pattern_count.add(second, self.window)
+
+    def summary(self, now):
+        """
+        :return: text with the total count and rate of each pattern
+        :rtype: str
+        """
+        second = int(now)
+        entries = []
+        for pattern_count in self._counts:
+            pattern_count.expire(second, self.window)
+            entries.append("'{}': {} ({:.1f}/s)".format(pattern_count.label, pattern_count.total,
+                                                        pattern_count.rate(self.window)))
+        return "{}: {}".format(self.filter_file.name, ", ".join(entries))
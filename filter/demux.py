@@ -0,0 +1,137 @@
+import re
+import threading
+import logger
+from util import main_thread
+
+log = logger.get()
+
+
+class _Channel(object):
+    def __init__(self, name, view=None):
+        """
+        :type name: str
+        :type view: sublime.View
+        """
+        self.name = name
+        self.view = view
+        # Text received before the channel's view has been created
+        self.pending = [] if view is None else None
+
+    def write(self, text):
+        main_thread(self.view.run_command, "serial_monitor_write", {"text": text})
+
+
+class ChannelDemux(object):
+    """
+    Routes lines to per-channel views based on a tag at the start of each line, e.g. "[BLE] connected".
+    The tag is extracted once per line and looked up in a dictionary of channels
+    """
+    # An identifier between a leading "[" and "]", so bracketed timestamps like "[    1.234]" are not tags
+    DEFAULT_PATTERN = r"^\[([A-Za-z_][\w-]{0,31})\]"
+    # Maximum number of views created for channels that were not given up front
+    MAX_AUTO_CHANNELS = 16
+
+    def __init__(self, view_factory, pattern=None, auto_create=True, channels=()):
+        """
+        :param view_factory: function that takes a channel name and returns a new view for it.  Called on the main thread
+        :param pattern: optional regex to extract the tag from a line with its first group.
+                        If not given, an identifier between a leading "[" and "]" is used
+        :type pattern: str
+        :param auto_create: whether to create views for channels that have not been seen before,
+                            up to MAX_AUTO_CHANNELS of them
+        :type auto_create: bool
+        :param channels: names of channels to create views for up front
+        :type channels: list of str
+        :raises re.error: if the pattern is not a valid regex
+        :raises ValueError: if the pattern has no group for the tag
+        """
+        self.view_factory = view_factory
+        self.pattern = re.compile(pattern or self.DEFAULT_PATTERN)
+        if self.pattern.groups < 1:
+            raise ValueError("the pattern needs a group to extract the tag, i.e. \"^<(\\w+)>\"")
+        self.auto_create = auto_create
+        self._channels = {}
+        self._auto_channels = 0
+        self._dropped_tags = False
+        self._lock = threading.Lock()
+        for name in channels:
+            self._add_channel(name)
+
+    def extract_tag(self, line):
+        """
+        Gets the channel tag of the line
+
+        :param line: the line to get the tag of, without a timestamp
+        :type line: str
+        :return: the tag, or None if the line doesn't have one
+        :rtype: str
+        """
+        match = self.pattern.match(line)
+        return match.group(1) if match else None
+
+    def route(self, lines):
+        """
+        Writes the lines to the views of their channels
+
+        :param lines: list of (line, text) pairs, where line is used to get the tag and text is written to the view
+        """
+        output = {}
+        for line, text in lines:
+            tag = self.extract_tag(line)
+            if tag is None:
+                continue
+            channel = self._channels.get(tag)
+            if channel is None:
+                if not self.auto_create:
+                    continue
+                if self._auto_channels >= self.MAX_AUTO_CHANNELS:
+                    self._drop(tag)
+                    continue
+                self._auto_channels += 1
+                channel = self._add_channel(tag)
+            if channel in output:
+                output[channel].append(text)
+            else:
+                output[channel] = [text]
+
+        for channel, channel_output in output.items():
+            self._write(channel, "".join(channel_output))
+
+    def write_all(self, text):
+        """
+        Writes the text to all channel views
+        """
+        for channel in list(self._channels.values()):
+            self._write(channel, text)
+
+    def channels(self):
+        return sorted(self._channels.keys())
+
+    def _drop(self, tag):
+        # Only logged once, a pattern matching more than the channel tags would log every line
+        if not self._dropped_tags:
+            self._dropped_tags = True
+            log.warning("Channel demux already created {} channel views, dropping lines of new channel \"{}\" "
+                        "and any other new channels".format(self.MAX_AUTO_CHANNELS, tag))
+
+    def _write(self, channel, text):
+        with self._lock:
+            if channel.pending is not None:
+                channel.pending.append(text)
+            elif channel.view.is_valid():
+                channel.write(text)
+
+    def _add_channel(self, name):
+        channel = _Channel(name)
+        self._channels[name] = channel
+        main_thread(self._create_view, channel)
+        return channel
+
+    def _create_view(self, channel):
+        view = self.view_factory(channel.name)
+        with self._lock:
+            channel.view = view
+            pending = channel.pending
+            channel.pending = None
+            if pending:
+                channel.write("".join(pending))
@@ -1,5 +1,12 @@
 import threading
+import time
+from collections import deque
 from util import main_thread
+from filter.backfill import FilterBackfill
+from filter.context import FilterContext
+from filter.record import RecordAssembler
+from filter.counter import FilterCounter
+from filter.serial_filter import FilterFile
 
 
 class _FilterArgs(object):
@@ -10,75 +17,227 @@ class _FilterArgs(object):
         """
         self.filter_file = filter_file
         self.view = view
+        self.context = FilterContext(filter_file.before, filter_file.after)
+        self.record = RecordAssembler(filter_file.record) if filter_file.record else None
+        self.backfill = None
+        self._held_text = None
+        self._hold_lock = threading.Lock()
 
-    def apply(self, text, timestamp=""):
-        if self.filter_file.check_filters(text):
-            self.write(text, timestamp)
+    def apply(self, index, line, text, history):
+        """
+        Checks a line against the filter
+
+        :param index: the running index of the line
+        :param line: the line to check
+        :param text: the line as it should be written, including the timestamp
+        :param history: ring buffer of the most recent (index, text) lines before this one
+
+        :return: the lines to write to the filter's view
+        :rtype: list of str
+        """
+        if self.record:
+            records = self.record.add_line(line, text, time.time())
+            return [record_text for record_line, record_text in records if self.filter_file.check_filters(record_line)]
+        return self.context.select(index, text, self.filter_file.check_filters(line), history)
+
+    def flush_idle(self, now):
+        """
+        Completes a multi-line record that has been idle for longer than its idle gap
+
+        :return: the lines to write to the filter's view
+        :rtype: list of str
+        """
+        if not self.record:
+            return []
+        record = self.record.flush_idle(now)
+        if record and self.filter_file.check_filters(record[0]):
+            return [record[1]]
+        return []
 
     def write(self, text, timestamp=""):
-        main_thread(self.view.run_command, "serial_monitor_write", {"text": timestamp + text})
+        with self._hold_lock:
+            # While the view is being back-filled, hold on to the live text so it is written after the history
+            if self._held_text is not None:
+                self._held_text.append(timestamp + text)
+                return
+        self.write_backfill(timestamp + text)
+
+    def write_backfill(self, text):
+        main_thread(self.view.run_command, "serial_monitor_write", {"text": text})
 
+    def hold(self):
+        with self._hold_lock:
+            self._held_text = []
+
+    def release(self):
+        with self._hold_lock:
+            held_text = self._held_text
+            self._held_text = None
+            if held_text:
+                self.write_backfill("".join(held_text))
 
 
 class FilterManager(object):
     def __init__(self):
         super(FilterManager, self).__init__()
         self._filters = []
+        self._counters = []
         self.filter_lock = threading.Lock()
         self._incomplete_line = ""
+        # Ring buffer of the most recent lines, sized for the filter with the most context lines before a match
+        self._history = deque(maxlen=0)
+        self._line_index = 0
+        self._demux = None
 
-    def add_filter(self, new_filter, output_view):
+    def add_filter(self, new_filter, output_view, backfill_view=None):
         """
         :type new_filter: serial_filter.FilterFile
+        :param backfill_view: optional view with existing output to scan for matches in the background
+        :type backfill_view: sublime.View
         """
+        if new_filter.mode == FilterFile.MODE_COUNT:
+            # Count-only filters don't have a view, they only keep track of the number of matches
+            with self.filter_lock:
+                self._counters.append(FilterCounter(new_filter))
+            return
+
         filter_args = _FilterArgs(new_filter, output_view)
+        if backfill_view:
+            filter_args.hold()
+            filter_args.backfill = FilterBackfill(filter_args, backfill_view, self._backfill_complete)
         with self.filter_lock:
             self._filters.append(filter_args)
+            self._resize_history()
+            # Text filtered from now on is written live.  Its view writes are queued after the back-fill's start
+            if filter_args.backfill:
+                filter_args.backfill.schedule()
 
     def remove_filter(self, filter_to_remove):
         """
         :type filter_to_remove: serial_filter.FilterFile
         """
+        with self.filter_lock:
+            self._counters = [c for c in self._counters if c.filter_file != filter_to_remove]
+
         filter_files = [f.filter_file for f in self._filters]
         if filter_to_remove in filter_files:
             with self.filter_lock:
                 i = filter_files.index(filter_to_remove)
                 filter_args = self._filters[i]
+                if filter_args.backfill:
+                    filter_args.backfill.cancel()
                 filter_args.write("Filter Disabled")
                 self._filters.remove(filter_args)
+                self._resize_history()
+
+    def set_demux(self, demux):
+        """
+        Sets the channel demultiplexer to route lines through, or None to disable it
+
+        :type demux: filter.demux.ChannelDemux
+        """
+        with self.filter_lock:
+            self._demux = demux
+
+    def demux(self):
+        return self._demux
 
     def port_closed(self, port_name):
         with self.filter_lock:
             for f in self._filters:
                 f.write("Disconnected from {}".format(port_name))
+            if self._demux:
+                self._demux.write_all("Disconnected from {}".format(port_name))
+
+    @staticmethod
+    def _backfill_complete(backfill):
+        backfill.filter_args.backfill = None
+        backfill.filter_args.release()
 
     def filters(self):
-        return [f.filter_file for f in self._filters]
+        return [f.filter_file for f in self._filters] + [c.filter_file for c in self._counters]
 
-    def apply_filters(self, text, timestamp=""):
-        if len(self._filters) == 0:
-            return
-        lines = self._split_text(text)
-        if len(lines) == 0:
-            return
+    def counter_summary(self):
+        """
+        :return: the counts and rates of all count-only filters, or an empty string if there are none
+        :rtype: str
+        """
+        with self.filter_lock:
+            now = time.time()
+            return " | ".join(c.summary(now) for c in self._counters)
 
-        filters_to_remove = []
-        # Loop through all lines and all filters for matches
-        for line in lines:
+    def apply_filters(self, text, timestamp=""):
+        if len(self._filters) == 0 and len(self._counters) == 0 and not self._demux:
+            # Keep track of the incomplete line so a filter added later, and its back-fill, gets the whole line
             with self.filter_lock:
-                for f in self._filters:
-                    if not f.view or not f.filter_file:
-                        continue
-
-                    if not f.view.is_valid():
-                        filters_to_remove.append(f)
-                    else:
-                        f.apply(line, timestamp)
+                end = text.rfind("\n")
+                self._incomplete_line = text[end + 1:] if end >= 0 else self._incomplete_line + text
+            return
 
-        # If any filters have invalid views, remove from the list
         with self.filter_lock:
+            lines = self._split_text(text)
+            if len(lines) == 0:
+                return
+
+            filters = []
+            filters_to_remove = []
+            for f in self._filters:
+                if not f.view or not f.filter_file:
+                    continue
+
+                if not f.view.is_valid():
+                    filters_to_remove.append(f)
+                else:
+                    filters.append(f)
+
+            # Loop through all lines and all filters for matches, collecting the output so each view gets one write
+            output = [[] for _ in filters]
+            for line in lines:
+                index = self._line_index
+                self._line_index += 1
+                line_text = timestamp + line
+                for f, filter_output in zip(filters, output):
+                    filter_output.extend(f.apply(index, line, line_text, self._history))
+                self._history.append((index, line_text))
+
+            for f, filter_output in zip(filters, output):
+                if filter_output:
+                    f.write("".join(filter_output))
+
+            if self._counters:
+                now = time.time()
+                for line in lines:
+                    for c in self._counters:
+                        c.count(line, now)
+
+            if self._demux:
+                self._demux.route([(line, timestamp + line) for line in lines])
+
+            # If any filters have invalid views, remove from the list
             for f in filters_to_remove:
                 self._filters.remove(f)
+            if filters_to_remove:
+                self._resize_history()
+
+    def check_idle(self):
+        """
+        Completes any multi-line records that have been idle for longer than their filter's idle gap.
+        Should be called periodically so records are written even if no more text is received
+        """
+        if len(self._filters) == 0:
+            return
+        with self.filter_lock:
+            now = time.time()
+            for f in self._filters:
+                if f.record and f.view and f.view.is_valid():
+                    output = f.flush_idle(now)
+                    if output:
+                        f.write("".join(output))
+
+    def _resize_history(self):
+        size = max([f.filter_file.before for f in self._filters] + [0])
+        if size != self._history.maxlen:
+            self._history = deque(self._history, maxlen=size)
 
     def _split_text(self, text):
         lines = text.splitlines(True)
@@ -0,0 +1,106 @@
+import re
+
+
+class RecordRule(object):
+    """
+    Settings describing how lines are grouped into multi-line records before they are filtered
+    """
+    DEFAULT_MAX_LINES = 500
+
+    def __init__(self, start=None, end=None, idle_gap=None, max_lines=DEFAULT_MAX_LINES):
+        """
+        :param start: regex matching the first line of a record
+        :type start: str
+        :param end: regex matching the last line of a record
+        :type end: str
+        :param idle_gap: seconds without a new line after which the current record is complete
+        :type idle_gap: float
+        :param max_lines: maximum number of lines in a record.  Longer records are split
+        :type max_lines: int
+        """
+        self.start = re.compile(start) if start else None
+        self.end = re.compile(end) if end else None
+        self.idle_gap = idle_gap
+        self.max_lines = max_lines
+
+
+class RecordAssembler(object):
+    """
+    Groups lines into records based on a RecordRule.
+    Lines are given as (line, text) pairs where line is the text to check the filters against and text is the text
+    to write, which can include a timestamp.  Records are returned in the same format
+    """
+    def __init__(self, rule):
+        """
+        :type rule: RecordRule
+        """
+        self.rule = rule
+        self._lines = []
+        self._text = []
+        self._in_record = False
+        self._last_time = None
+
+    def add_line(self, line, text, now=None):
+        """
+        Adds a line to the current record
+
+        :param line: the line to check filters against
+        :param text: the line as it should be written
+        :param now: the time the line was received, or None to ignore the idle gap rule
+
+        :return: list of (line, text) records completed by this line
+        """
+        records = []
+        if self._in_record and self._is_idle(now):
+            records.append(self._take())
+        self._last_time = now
+
+        rule = self.rule
+        if rule.start and rule.start.search(line):
+            if self._in_record:
+                records.append(self._take())
+            self._in_record = True
+        elif not self._in_record and rule.start:
+            # Line is outside of any record, pass it through on its own
+            records.append((line, text))
+            return records
+
+        self._in_record = True
+        self._lines.append(line)
+        self._text.append(text)
+
+        if (rule.end and rule.end.search(line)) or len(self._lines) >= rule.max_lines:
+            records.append(self._take())
+        return records
+
+    def flush_idle(self, now):
+        """
+        Completes the current record if no line has been added for longer than the idle gap
+
+        :return: the completed (line, text) record, or None
+        """
+        if self._in_record and self._is_idle(now):
+            return self._take()
+        return None
+
+    def flush(self):
+        """
+        Completes the current record regardless of the rule
+
+        :return: the completed (line, text) record, or None
+        """
+        if self._in_record:
+            return self._take()
+        return None
+
+    def _is_idle(self, now):
+        if not self.rule.idle_gap or now is None or self._last_time is None:
+            return False
+        return now - self._last_time >= self.rule.idle_gap
+
+    def _take(self):
+        record = ("".join(self._lines), "".join(self._text))
+        self._lines = []
+        self._text = []
+        self._in_record = False
+        return record
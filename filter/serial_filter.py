@@ -4,6 +4,7 @@ import json
 import re
 
 from json_utils import clean_json
+from filter.record import RecordRule
 
 
 
@@ -96,6 +97,19 @@ class FilterFile(object):
     KEY_NAME = "name"
     KEY_FILTERS = "filters"
     KEY_EXCLUDE = "exclude"
+    KEY_BEFORE = "before"
+    KEY_AFTER = "after"
+    KEY_RECORD = "record"
+    KEY_MODE = "mode"
+    # filter modes
+    MODE_VIEW = "view"
+    MODE_COUNT = "count"
+    MODES = [MODE_VIEW, MODE_COUNT]
+    # record parameters
+    KEY_RECORD_START = "start"
+    KEY_RECORD_END = "end"
+    KEY_RECORD_IDLE_GAP = "idle_gap"
+    KEY_RECORD_MAX_LINES = "max_lines"
     # filter parameters
     KEY_METHOD = "method"
     KEY_TEXT = "text"
@@ -103,10 +117,14 @@ class FilterFile(object):
     REQUIRED_FILTER_PARAMS = [KEY_TEXT, KEY_METHOD]
     REQUIRED_FILTER_FILE_PARAMS = [KEY_NAME, KEY_FILTERS]
 
-    def __init__(self, name, filter_list, exclude=False):
+    def __init__(self, name, filter_list, exclude=False, before=0, after=0, record=None, mode=MODE_VIEW):
         self.name = name
         self.filter_list = filter_list
         self.exclude = exclude
+        self.before = before
+        self.after = after
+        self.record = record
+        self.mode = mode
 
     @staticmethod
     def parse_filter_file(file_text, skip_invalid_filters=False):
@@ -138,6 +156,25 @@ class FilterFile(object):
             print("Bad exclude value {}. Defaulting to false".format(exclude))
             exclude = False
 
+        before = file.get(FilterFile.KEY_BEFORE, 0)
+        if not isinstance(before, int) or isinstance(before, bool) or before < 0:
+            print("Bad before value {}. Defaulting to 0".format(before))
+            before = 0
+
+        after = file.get(FilterFile.KEY_AFTER, 0)
+        if not isinstance(after, int) or isinstance(after, bool) or after < 0:
+            print("Bad after value {}. Defaulting to 0".format(after))
+            after = 0
+
+        mode = file.get(FilterFile.KEY_MODE, FilterFile.MODE_VIEW)
+        if mode not in FilterFile.MODES:
+            print("Bad mode value {}. Defaulting to {}".format(mode, FilterFile.MODE_VIEW))
+            mode = FilterFile.MODE_VIEW
+
+        record = None
+        if FilterFile.KEY_RECORD in file:
+            record = FilterFile._parse_record(file[FilterFile.KEY_RECORD])
+
         filter_list = []
         i = -1
         for f in file[FilterFile.KEY_FILTERS]:
@@ -166,7 +203,41 @@ class FilterFile(object):
                 case_sensitive = False
 
             filter_list.append(filter_type(text, case_sensitive))
-        return FilterFile(name, filter_list, exclude)
+        return FilterFile(name, filter_list, exclude, before, after, record, mode)
+
+    @staticmethod
+    def _parse_record(record):
+        """
+        Parses the record assembly settings of a filter file
+
+        :param record: the "record" object of the filter file
+        :type record: dict
+
+        :rtype: RecordRule
+        """
+        if not isinstance(record, dict):
+            raise FilterAttributeError("Bad record value {}.  Must be an object".format(record))
+
+        start = record.get(FilterFile.KEY_RECORD_START)
+        end = record.get(FilterFile.KEY_RECORD_END)
+        idle_gap = record.get(FilterFile.KEY_RECORD_IDLE_GAP)
+        max_lines = record.get(FilterFile.KEY_RECORD_MAX_LINES, RecordRule.DEFAULT_MAX_LINES)
+
+        if not start and not end and not idle_gap:
+            raise FilterAttributeError("Record requires at least one of: {}".format(
+                [FilterFile.KEY_RECORD_START, FilterFile.KEY_RECORD_END, FilterFile.KEY_RECORD_IDLE_GAP]))
+
+        if idle_gap is not None and (not isinstance(idle_gap, (int, float)) or idle_gap < 0):
+            raise FilterAttributeError("Bad record idle_gap value {}".format(idle_gap))
+
+        if not isinstance(max_lines, int) or isinstance(max_lines, bool) or max_lines < 1:
+            print("Bad record max_lines value {}. Defaulting to {}".format(max_lines, RecordRule.DEFAULT_MAX_LINES))
+            max_lines = RecordRule.DEFAULT_MAX_LINES
+
+        try:
+            return RecordRule(start, end, idle_gap, max_lines)
+        except re.error as ex:
+            raise FilterAttributeError("Bad record pattern: {}".format(ex))
 
     def check_filters(self, text):
         """
@@ -14,17 +14,49 @@ def _is_test_mode():
     return bool(settings.get("test_mode"))
 
 
-def create_serial(*args, **kwargs):
+def create_serial(*args, use_poll=False, **kwargs):
     """
     Creates a serial port with the args provided
 
+    :param use_poll: Use the poll based implementation if the platform has one.
+                     It handles devices disconnecting while in use (e.g. USB-serial unplugged) better
+    :type use_poll: bool
+
     :return: The serial object
     :rtype: serial.SerialBase
     """
     if _is_test_mode():
         return mock_serial.Serial(*args, **kwargs)
+    if use_poll and hasattr(serial, "PosixPollSerial"):
+        return serial.PosixPollSerial(*args, **kwargs)
     return serial.Serial(*args, **kwargs)
 
+
+def is_url(port):
+    """
+    Checks if the port is a URL handled by serial_for_url (e.g. "rfc2217://host:port") instead of a device name
+
+    :type port: str
+    :rtype: bool
+    """
+    return "://" in port
+
+
+def create_serial_for_url(url, *args, **kwargs):
+    """
+    Creates a serial port for a URL such as "rfc2217://", "socket://", "loop://" or "hwgrep://".
+    The port is not opened
+
+    :param url: the URL of the port
+    :type url: str
+
+    :return: The serial object
+    :rtype: serial.SerialBase
+    """
+    if _is_test_mode():
+        return mock_serial.Serial(None, *args, **kwargs)
+    return serial.serial_for_url(url, *args, do_not_open=True, **kwargs)
+
 def list_serial_ports(exclude=[]):
     """
     Lists the available serial ports in the system,
@@ -37,4 +69,47 @@ def list_serial_ports(exclude=[]):
     """
     if _is_test_mode():
         return mock_serial.list_ports(exclude=exclude)
-    return serial_utils.list_ports(exclude=exclude)
\ No newline at end of file
+    return serial_utils.list_ports(exclude=exclude)
+
+def describe_serial_ports(ports):
+    """
+    Gets descriptions of the given serial ports to show alongside their names
+
+    :param ports: the port names
+    :type ports: list of str
+    :return: dict of port name to description
+    :rtype: dict
+    """
+    if _is_test_mode():
+        return {}
+    return serial_utils.describe_ports(ports)
+
+
+def port_hardware_id(port):
+    """
+    :return: the hardware ID of a USB serial port, or None if it doesn't have one
+    :rtype: str
+    """
+    if _is_test_mode():
+        return None
+    return serial_utils.port_hardware_id(port)
+
+
+def find_port_by_hardware_id(hwid):
+    """
+    :return: the port with the given hardware ID, or None
+    :rtype: str
+    """
+    if _is_test_mode():
+        return None
+    return serial_utils.find_port_by_hardware_id(hwid)
+
+
+def device_watcher():
+    """
+    :return: a watcher that can wait for serial devices to be added or removed
+    """
+    if _is_test_mode():
+        # Mock ports don't have devices to watch
+        return serial_utils.device_watcher(None)
+    return serial_utils.device_watcher()
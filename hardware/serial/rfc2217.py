@@ -57,6 +57,7 @@
 #   Without this option it expects that the server sends notifications
 #   automatically on change (which most servers do and is according to the
 #   RFC).
+# - "rcvbuf=<bytes>": size of the socket receive buffer (SO_RCVBUF)
 # the order of the options is not relevant
 
 from serial.serialutil import *
@@ -64,7 +65,6 @@ import time
 import struct
 import socket
 import threading
-import queue
 import logging
 
 # port string is expected to be something like this:
@@ -339,12 +339,7 @@ class TelnetSubnegotiation(object):
         can also throw a value error when the answer from the server does not
         match the value sent.
         """
-        timeout_time = time.time() + timeout
-        while time.time() < timeout_time:
-            time.sleep(0.05)    # prevent 100% CPU load
-            if self.isReady():
-                break
-        else:
+        if not self.connection._waitForNegotiation(self.isReady, timeout):
             raise SerialException("timeout while waiting for option %r" % (self.name))
 
     def checkAnswer(self, suboption):
@@ -367,6 +362,10 @@ class RFC2217Serial(SerialBase):
     BAUDRATES = (50, 75, 110, 134, 150, 200, 300, 600, 1200, 1800, 2400, 4800,
                  9600, 19200, 38400, 57600, 115200)
 
+    # data read from the front of the read buffer is kept until it is at
+    # least this large (and half of the buffer)
+    READ_COMPACT_SIZE = 65536
+
     def open(self):
         """\
         Open port with current settings. This may throw a SerialException
@@ -376,13 +375,18 @@ class RFC2217Serial(SerialBase):
         self._ignore_set_control_answer = False
         self._poll_modem_state = False
         self._network_timeout = 3
+        self._rcvbuf = None
         if self._port is None:
             raise SerialException("Port must be configured before it can be used.")
         if self._isOpen:
             raise SerialException("Port is already open.")
         try:
+            address = self.fromURL(self.portstr)
             self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self._socket.connect(self.fromURL(self.portstr))
+            if self._rcvbuf:
+                # must be set before connecting for the TCP window to use it
+                self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self._rcvbuf)
+            self._socket.connect(address)
             self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
         except Exception as msg:
             self._socket = None
@@ -390,9 +394,21 @@ class RFC2217Serial(SerialBase):
 
         self._socket.settimeout(5) # XXX good value?
 
-        # use a thread save queue as buffer. it also simplifies implementing
-        # the read timeout
-        self._read_buffer = queue.Queue()
+        # received data is kept in a bytearray guarded by a condition
+        # variable. the reader thread adds whole runs of data at once and
+        # notifies waiting readers, so a large read costs only a few lock
+        # round trips instead of one per byte. reads advance an offset, the
+        # data in front of it is dropped in bulk (see _consume)
+        self._read_buffer = bytearray()
+        self._read_offset = 0
+        self._read_condition = threading.Condition(threading.Lock())
+        # telnet filter state of the reader thread
+        self._telnet_mode = M_NORMAL
+        self._telnet_suboption = None
+        self._telnet_command = None
+        # signalled by the reader thread whenever an option negotiation or
+        # subnegotiation answer was processed
+        self._negotiation_condition = threading.Condition(threading.Lock())
         # to ensure that user writes does not interfere with internal
         # telnet/rfc2217 options establish a lock
         self._write_lock = threading.Lock()
@@ -428,6 +444,7 @@ class RFC2217Serial(SerialBase):
         self._linestate = 0
         self._modemstate = None
         self._modemstate_expires = 0
+        self._modemstate_updates = 0
         # RFC 2217 flow control between server and client
         self._remote_suspend_flow = False
 
@@ -441,12 +458,9 @@ class RFC2217Serial(SerialBase):
             if option.state is REQUESTED:
                 self.telnetSendOption(option.send_yes, option.option)
         # now wait until important options are negotiated
-        timeout_time = time.time() + self._network_timeout
-        while time.time() < timeout_time:
-            time.sleep(0.05)    # prevent 100% CPU load
-            if sum(o.active for o in mandadory_options) == sum(o.state != INACTIVE for o in mandadory_options):
-                break
-        else:
+        def _negotiated():
+            return sum(o.active for o in mandadory_options) == sum(o.state != INACTIVE for o in mandadory_options)
+        if not self._waitForNegotiation(_negotiated, self._network_timeout):
             raise SerialException("Remote does not seem to support RFC2217 or BINARY mode %r" % mandadory_options)
         if self.logger:
             self.logger.info("Negotiated options: %s" % self._telnet_options)
@@ -486,12 +500,7 @@ class RFC2217Serial(SerialBase):
         items = list(self._rfc2217_port_settings.values())
         if self.logger:
             self.logger.debug("Negotiating settings: %s" % (items,))
-        timeout_time = time.time() + self._network_timeout
-        while time.time() < timeout_time:
-            time.sleep(0.05)    # prevent 100% CPU load
-            if sum(o.active for o in items) == len(items):
-                break
-        else:
+        if not self._waitForNegotiation(lambda: sum(o.active for o in items) == len(items), self._network_timeout):
             raise SerialException("Remote does not accept parameter change (RFC2217): %r" % items)
         if self.logger:
             self.logger.info("Negotiated settings: %s" % (items,))
@@ -550,6 +559,8 @@ class RFC2217Serial(SerialBase):
                         self._poll_modem_state = True
                     elif option == 'timeout':
                         self._network_timeout = float(value)
+                    elif option == 'rcvbuf':
+                        self._rcvbuf = int(value)
                     else:
                         raise ValueError('unknown option: %r' % (option,))
             # get host and port
@@ -565,7 +576,36 @@ class RFC2217Serial(SerialBase):
     def inWaiting(self):
         """Return the number of characters currently in the input buffer."""
         if not self._isOpen: raise portNotOpenError
-        return self._read_buffer.qsize()
+        return len(self._read_buffer) - self._read_offset
+
+    def _consume(self, size):
+        """\
+        internal - take up to size bytes from the read buffer. must be called
+        with _read_condition held. deleting from the front of a bytearray
+        copies the remaining data (before Python 3.4), so the data read is
+        only deleted once it is at least half of the buffer.
+        """
+        start = self._read_offset
+        data = bytes(self._read_buffer[start:start + size])
+        self._read_offset += len(data)
+        if self._read_offset >= len(self._read_buffer):
+            del self._read_buffer[:]
+            self._read_offset = 0
+        elif self._read_offset > self.READ_COMPACT_SIZE and self._read_offset * 2 > len(self._read_buffer):
+            del self._read_buffer[:self._read_offset]
+            self._read_offset = 0
+        return data
+
+    def _unread(self, data):
+        """internal - put back data, the next read returns it first"""
+        with self._read_condition:
+            n = len(data)
+            if n <= self._read_offset:
+                # usually the data was just read, it goes back in its place
+                self._read_offset -= n
+                self._read_buffer[self._read_offset:self._read_offset + n] = data
+            else:
+                self._read_buffer[self._read_offset:self._read_offset] = data
 
     def read(self, size=1):
         """\
@@ -574,15 +614,23 @@ class RFC2217Serial(SerialBase):
         until the requested number of bytes is read.
         """
         if not self._isOpen: raise portNotOpenError
-        data = bytearray()
-        try:
-            while len(data) < size:
+        if self._timeout is not None:
+            timeout_time = time.time() + self._timeout
+        with self._read_condition:
+            while len(self._read_buffer) - self._read_offset < size:
                 if self._thread is None:
+                    if len(self._read_buffer) > self._read_offset:
+                        break   # deliver what was received before the connection failed
                     raise SerialException('connection failed (reader thread died)')
-                data.append(self._read_buffer.get(True, self._timeout))
-        except queue.Empty: # -> timeout
-            pass
-        return bytes(data)
+                if self._timeout is None:
+                    self._read_condition.wait()
+                else:
+                    timeleft = timeout_time - time.time()
+                    if timeleft <= 0:
+                        break   # timeout
+                    self._read_condition.wait(timeleft)
+            data = self._consume(size)
+        return data
 
     def write(self, data):
         """\
@@ -594,7 +642,10 @@ class RFC2217Serial(SerialBase):
         self._write_lock.acquire()
         try:
             try:
-                self._socket.sendall(to_bytes(data).replace(IAC, IAC_DOUBLED))
+                d = to_bytes(data)
+                if IAC in d:
+                    d = d.replace(IAC, IAC_DOUBLED)
+                self._socket.sendall(d)
             except socket.error as e:
                 raise SerialException("connection failed (socket error): %s" % e) # XXX what exception if socket connection fails
         finally:
@@ -606,8 +657,9 @@ class RFC2217Serial(SerialBase):
         if not self._isOpen: raise portNotOpenError
         self.rfc2217SendPurge(PURGE_RECEIVE_BUFFER)
         # empty read buffer
-        while self._read_buffer.qsize():
-            self._read_buffer.get(False)
+        with self._read_condition:
+            del self._read_buffer[:]
+            self._read_offset = 0
 
     def flushOutput(self):
         """\
@@ -687,12 +739,10 @@ class RFC2217Serial(SerialBase):
 
     def _telnetReadLoop(self):
         """Read loop for the socket."""
-        mode = M_NORMAL
-        suboption = None
         try:
             while self._socket is not None:
                 try:
-                    data = self._socket.recv(1024)
+                    data = self._socket.recv(16384)
                 except socket.timeout:
                     # just need to get out of recv form time to time to check if
                     # still alive
@@ -703,52 +753,84 @@ class RFC2217Serial(SerialBase):
                         self.logger.debug("socket error in reader thread: %s" % (e,))
                     break
                 if not data: break # lost connection
-                for byte in data:
-                    if mode == M_NORMAL:
-                        # interpret as command or as data
-                        if byte == IAC:
-                            mode = M_IAC_SEEN
-                        else:
-                            # store data in read buffer or sub option buffer
-                            # depending on state
-                            if suboption is not None:
-                                suboption.append(byte)
-                            else:
-                                self._read_buffer.put(byte)
-                    elif mode == M_IAC_SEEN:
-                        if byte == IAC:
-                            # interpret as command doubled -> insert character
-                            # itself
-                            if suboption is not None:
-                                suboption.append(IAC)
-                            else:
-                                self._read_buffer.put(IAC)
-                            mode = M_NORMAL
-                        elif byte == SB:
-                            # sub option start
-                            suboption = bytearray()
-                            mode = M_NORMAL
-                        elif byte == SE:
-                            # sub option end -> process it now
-                            self._telnetProcessSubnegotiation(bytes(suboption))
-                            suboption = None
-                            mode = M_NORMAL
-                        elif byte in (DO, DONT, WILL, WONT):
-                            # negotiation
-                            telnet_command = byte
-                            mode = M_NEGOTIATE
-                        else:
-                            # other telnet commands
-                            self._telnetProcessCommand(byte)
-                            mode = M_NORMAL
-                    elif mode == M_NEGOTIATE: # DO, DONT, WILL, WONT was received, option now following
-                        self._telnetNegotiateOption(telnet_command, byte)
-                        mode = M_NORMAL
+                self._telnetProcessData(data)
         finally:
             self._thread = None
+            # wake up readers waiting for data and negotiations
+            with self._read_condition:
+                self._read_condition.notify_all()
+            self._notifyNegotiation()
             if self.logger:
                 self.logger.debug("read thread terminated")
 
+    def _telnetProcessData(self, data):
+        """\
+        Process a chunk received from the socket. Runs of plain data are
+        located with find(IAC) and copied in one slice, only IAC sequences go
+        through the telnet state machine byte by byte.
+        """
+        view = memoryview(data)
+        runs = []
+        pos = 0
+        length = len(data)
+        while pos < length:
+            if self._telnet_mode == M_NORMAL:
+                index = data.find(IAC, pos)
+                end = length if index < 0 else index
+                if end > pos:
+                    # store data in read buffer or sub option buffer
+                    # depending on state
+                    if self._telnet_suboption is not None:
+                        self._telnet_suboption.extend(view[pos:end])
+                    else:
+                        runs.append(view[pos:end])
+                if index < 0:
+                    break
+                self._telnet_mode = M_IAC_SEEN
+                pos = index + 1
+                continue
+
+            byte = data[pos:pos + 1]
+            pos += 1
+            if self._telnet_mode == M_IAC_SEEN:
+                if byte == IAC:
+                    # interpret as command doubled -> insert character
+                    # itself
+                    if self._telnet_suboption is not None:
+                        self._telnet_suboption.extend(IAC)
+                    else:
+                        runs.append(IAC)
+                    self._telnet_mode = M_NORMAL
+                elif byte == SB:
+                    # sub option start
+                    self._telnet_suboption = bytearray()
+                    self._telnet_mode = M_NORMAL
+                elif byte == SE:
+                    # sub option end -> process it now
+                    if self._telnet_suboption is not None:
+                        self._telnetProcessSubnegotiation(bytes(self._telnet_suboption))
+                    self._telnet_suboption = None
+                    self._telnet_mode = M_NORMAL
+                    self._notifyNegotiation()
+                elif byte in (DO, DONT, WILL, WONT):
+                    # negotiation
+                    self._telnet_command = byte
+                    self._telnet_mode = M_NEGOTIATE
+                else:
+                    # other telnet commands
+                    self._telnetProcessCommand(byte)
+                    self._telnet_mode = M_NORMAL
+            elif self._telnet_mode == M_NEGOTIATE: # DO, DONT, WILL, WONT was received, option now following
+                self._telnetNegotiateOption(self._telnet_command, byte)
+                self._telnet_mode = M_NORMAL
+                self._notifyNegotiation()
+
+        if runs:
+            with self._read_condition:
+                for run in runs:
+                    self._read_buffer.extend(run)
+                self._read_condition.notify_all()
+
     # - incoming telnet commands and options
 
     def _telnetProcessCommand(self, command):
@@ -790,6 +872,7 @@ class RFC2217Serial(SerialBase):
                     self.logger.info("NOTIFY_MODEMSTATE: %s" % self._modemstate)
                 # update time when we think that a poll would make sense
                 self._modemstate_expires = time.time() + 0.3
+                self._modemstate_updates += 1
             elif suboption[1:2] == FLOWCONTROL_SUSPEND:
                 self._remote_suspend_flow = True
             elif suboption[1:2] == FLOWCONTROL_RESUME:
@@ -807,6 +890,27 @@ class RFC2217Serial(SerialBase):
             if self.logger:
                 self.logger.warning("ignoring subnegotiation: %r" % (suboption,))
 
+    def _notifyNegotiation(self):
+        """Wake up threads waiting for a negotiation answer."""
+        with self._negotiation_condition:
+            self._negotiation_condition.notify_all()
+
+    def _waitForNegotiation(self, predicate, timeout):
+        """\
+        Wait until predicate() is true. It is checked again each time the
+        reader thread processed a negotiation or subnegotiation answer, so
+        this returns after about one round trip instead of polling.
+        Returns False on timeout or when the reader thread died.
+        """
+        timeout_time = time.time() + timeout
+        with self._negotiation_condition:
+            while not predicate():
+                timeleft = timeout_time - time.time()
+                if timeleft <= 0 or self._thread is None:
+                    return False
+                self._negotiation_condition.wait(timeleft)
+        return True
+
     # - outgoing telnet commands and options
 
     def _internal_raw_write(self, data):
@@ -821,7 +925,7 @@ class RFC2217Serial(SerialBase):
         """Send DO, DONT, WILL, WONT."""
         self._internal_raw_write(to_bytes([IAC, action, option]))
 
-    def rfc2217SendSubnegotiation(self, option, value=''):
+    def rfc2217SendSubnegotiation(self, option, value=b''):
         """Subnegotiation of RFC2217 parameters."""
         value = value.replace(IAC, IAC_DOUBLED)
         self._internal_raw_write(to_bytes([IAC, SB, COM_PORT_OPTION, option] + list(value) + [IAC, SE]))
@@ -861,17 +965,13 @@ class RFC2217Serial(SerialBase):
         if self._poll_modem_state and self._modemstate_expires < time.time():
             if self.logger:
                 self.logger.debug('polling modem state')
-            # when it is older, request an update
+            # when it is older, request an update and wait for the reader
+            # thread to signal that a new value was received
+            updates = self._modemstate_updates
             self.rfc2217SendSubnegotiation(NOTIFY_MODEMSTATE)
-            timeout_time = time.time() + self._network_timeout
-            while time.time() < timeout_time:
-                time.sleep(0.05)    # prevent 100% CPU load
-                # when expiration time is updated, it means that there is a new
-                # value
-                if self._modemstate_expires > time.time():
-                    if self.logger:
-                        self.logger.warning('poll for modem state failed')
-                    break
+            if not self._waitForNegotiation(lambda: self._modemstate_updates != updates, self._network_timeout):
+                if self.logger:
+                    self.logger.warning('poll for modem state failed')
             # even when there is a timeout, do not generate an error just
             # return the last known value. this way we can support buggy
             # servers that do not respond to polls, but send automatic
@@ -969,7 +1069,7 @@ class PortManager(object):
         """Send DO, DONT, WILL, WONT."""
         self.connection.write(to_bytes([IAC, action, option]))
 
-    def rfc2217SendSubnegotiation(self, option, value=''):
+    def rfc2217SendSubnegotiation(self, option, value=b''):
         """Subnegotiation of RFC 2217 parameters."""
         value = value.replace(IAC, IAC_DOUBLED)
         self.connection.write(to_bytes([IAC, SB, COM_PORT_OPTION, option] + list(value) + [IAC, SE]))
@@ -1013,56 +1113,73 @@ class PortManager(object):
 
     def escape(self, data):
         """\
-        This generator function is for the user. All outgoing data has to be
+        This function is for the user. All outgoing data has to be
         properly escaped, so that no IAC character in the data stream messes up
-        the Telnet state machine in the server.
+        the Telnet state machine in the server. The whole chunk is escaped at
+        once.
 
         socket.sendall(escape(data))
         """
-        for byte in data:
-            if byte == IAC:
-                yield IAC
-                yield IAC
-            else:
-                yield byte
+        data = to_bytes(data)
+        if IAC in data:
+            return data.replace(IAC, IAC_DOUBLED)
+        return data
 
     # - incoming data filter
 
     def filter(self, data):
         """\
-        Handle a bunch of incoming bytes. This is a generator. It will yield
-        all characters not of interest for Telnet/RFC 2217.
+        Handle a bunch of incoming bytes. Returns all bytes not of interest
+        for Telnet/RFC 2217 as one bytes object. Runs of plain data are
+        located with find(IAC) and copied in bulk, only IAC sequences go
+        through the state machine.
 
         The idea is that the reader thread pushes data from the socket through
         this filter:
 
-        for byte in filter(socket.recv(1024)):
-            # do things like CR/LF conversion/whatever
-            # and write data to the serial port
-            serial.write(byte)
+        data = filter(socket.recv(1024))
+        # do things like CR/LF conversion/whatever
+        # and write data to the serial port
+        serial.write(data)
 
         (socket error handling code left as exercise for the reader)
         """
-        for byte in data:
+        data = to_bytes(data)
+        # fast path: nothing but data, pass it through without copying
+        if self.mode == M_NORMAL and self.suboption is None and IAC not in data:
+            return data
+
+        view = memoryview(data)
+        runs = []
+        pos = 0
+        length = len(data)
+        while pos < length:
             if self.mode == M_NORMAL:
-                # interpret as command or as data
-                if byte == IAC:
-                    self.mode = M_IAC_SEEN
-                else:
+                index = data.find(IAC, pos)
+                end = length if index < 0 else index
+                if end > pos:
                     # store data in sub option buffer or pass it to our
                     # consumer depending on state
                     if self.suboption is not None:
-                        self.suboption.append(byte)
+                        self.suboption.extend(view[pos:end])
                     else:
-                        yield byte
-            elif self.mode == M_IAC_SEEN:
+                        runs.append(view[pos:end])
+                if index < 0:
+                    break
+                self.mode = M_IAC_SEEN
+                pos = index + 1
+                continue
+
+            byte = data[pos:pos + 1]
+            pos += 1
+            if self.mode == M_IAC_SEEN:
                 if byte == IAC:
                     # interpret as command doubled -> insert character
                     # itself
                     if self.suboption is not None:
-                        self.suboption.append(byte)
+                        self.suboption.extend(IAC)
                     else:
-                        yield byte
+                        runs.append(IAC)
                     self.mode = M_NORMAL
                 elif byte == SB:
                     # sub option start
@@ -1070,7 +1187,8 @@ class PortManager(object):
                     self.mode = M_NORMAL
                 elif byte == SE:
                     # sub option end -> process it now
-                    self._telnetProcessSubnegotiation(bytes(self.suboption))
+                    if self.suboption is not None:
+                        self._telnetProcessSubnegotiation(bytes(self.suboption))
                     self.suboption = None
                     self.mode = M_NORMAL
                 elif byte in (DO, DONT, WILL, WONT):
@@ -1084,6 +1202,7 @@ class PortManager(object):
             elif self.mode == M_NEGOTIATE: # DO, DONT, WILL, WONT was received, option now following
                 self._telnetNegotiateOption(self.telnet_command, byte)
                 self.mode = M_NORMAL
+        return b''.join(runs)
 
     # - incoming telnet commands and options
 
@@ -58,6 +58,41 @@ if   plat[:5] == 'linux':    # Linux (confirmed)
         except IOError as e:
             raise ValueError('Failed to set custom baud rate (%s): %s' % (baudrate, e))
 
+    TIOCGSERIAL = 0x541E
+    TIOCSSERIAL = 0x541F
+    ASYNC_LOW_LATENCY = 0x2000
+
+    def set_low_latency_mode(port, low_latency):
+        # serial_struct, flags is the 5th int
+        import array
+        buf = array.array('i', [0] * 32)
+
+        try:
+            FCNTL.ioctl(port.fd, TIOCGSERIAL, buf)
+            if low_latency:
+                buf[4] |= ASYNC_LOW_LATENCY
+            else:
+                buf[4] &= ~ASYNC_LOW_LATENCY
+            FCNTL.ioctl(port.fd, TIOCSSERIAL, buf)
+        except IOError as e:
+            raise ValueError('Failed to update ASYNC_LOW_LATENCY flag to %s: %s' % (low_latency, e))
+
+    TIOCGICOUNT = 0x545D
+    # fields of struct serial_icounter_struct, in order
+    ICOUNT_FIELDS = ('cts', 'dsr', 'rng', 'dcd', 'rx', 'tx', 'frame',
+                     'overrun', 'parity', 'brk', 'buf_overrun')
+
+    def get_input_counters(port):
+        # serial_icounter_struct has 11 counters and 9 reserved ints
+        import array
+        buf = array.array('i', [0] * 20)
+
+        try:
+            FCNTL.ioctl(port.fd, TIOCGICOUNT, buf)
+        except IOError as e:
+            raise ValueError('Failed to read the interrupt counters: %s' % (e,))
+        return dict(zip(ICOUNT_FIELDS, buf))
+
     baudrate_constants = {
         0:       0000000,  # hang up
         50:      0o000001,
@@ -100,6 +135,12 @@ elif plat == 'cygwin':       # cygwin/win32 (confirmed)
     def set_special_baudrate(port, baudrate):
         raise ValueError("sorry don't know how to handle non standard baud rate on this platform")
 
+    def set_low_latency_mode(port, low_latency):
+        raise ValueError("sorry don't know how to set the low latency mode on this platform")
+
+    def get_input_counters(port):
+        raise ValueError("sorry don't know how to read the interrupt counters on this platform")
+
     baudrate_constants = {
         128000: 0x01003,
         256000: 0x01005,
@@ -122,6 +163,12 @@ elif plat[:7] == 'openbsd':    # OpenBSD
     def set_special_baudrate(port, baudrate):
         raise ValueError("sorry don't know how to handle non standard baud rate on this platform")
 
+    def set_low_latency_mode(port, low_latency):
+        raise ValueError("sorry don't know how to set the low latency mode on this platform")
+
+    def get_input_counters(port):
+        raise ValueError("sorry don't know how to read the interrupt counters on this platform")
+
     baudrate_constants = {}
 
 elif plat[:3] == 'bsd' or  \
@@ -133,6 +180,12 @@ elif plat[:3] == 'bsd' or  \
     def set_special_baudrate(port, baudrate):
         raise ValueError("sorry don't know how to handle non standard baud rate on this platform")
 
+    def set_low_latency_mode(port, low_latency):
+        raise ValueError("sorry don't know how to set the low latency mode on this platform")
+
+    def get_input_counters(port):
+        raise ValueError("sorry don't know how to read the interrupt counters on this platform")
+
     baudrate_constants = {}
 
 elif plat[:6] == 'darwin':   # OS X
@@ -153,6 +206,12 @@ elif plat[:6] == 'darwin':   # OS X
     def device(port):
         return '/dev/cuad%d' % port
 
+    def set_low_latency_mode(port, low_latency):
+        raise ValueError("sorry don't know how to set the low latency mode on this platform")
+
+    def get_input_counters(port):
+        raise ValueError("sorry don't know how to read the interrupt counters on this platform")
+
     baudrate_constants = {}
 
 
@@ -164,6 +223,12 @@ elif plat[:6] == 'netbsd':   # NetBSD 1.6 testing by Erk
     def set_special_baudrate(port, baudrate):
         raise ValueError("sorry don't know how to handle non standard baud rate on this platform")
 
+    def set_low_latency_mode(port, low_latency):
+        raise ValueError("sorry don't know how to set the low latency mode on this platform")
+
+    def get_input_counters(port):
+        raise ValueError("sorry don't know how to read the interrupt counters on this platform")
+
     baudrate_constants = {}
 
 elif plat[:4] == 'irix':     # IRIX (partially tested)
@@ -174,6 +239,12 @@ elif plat[:4] == 'irix':     # IRIX (partially tested)
     def set_special_baudrate(port, baudrate):
         raise ValueError("sorry don't know how to handle non standard baud rate on this platform")
 
+    def set_low_latency_mode(port, low_latency):
+        raise ValueError("sorry don't know how to set the low latency mode on this platform")
+
+    def get_input_counters(port):
+        raise ValueError("sorry don't know how to read the interrupt counters on this platform")
+
     baudrate_constants = {}
 
 elif plat[:2] == 'hp':       # HP-UX (not tested)
@@ -184,6 +255,12 @@ elif plat[:2] == 'hp':       # HP-UX (not tested)
     def set_special_baudrate(port, baudrate):
         raise ValueError("sorry don't know how to handle non standard baud rate on this platform")
 
+    def set_low_latency_mode(port, low_latency):
+        raise ValueError("sorry don't know how to set the low latency mode on this platform")
+
+    def get_input_counters(port):
+        raise ValueError("sorry don't know how to read the interrupt counters on this platform")
+
     baudrate_constants = {}
 
 elif plat[:5] == 'sunos':    # Solaris/SunOS (confirmed)
@@ -194,6 +271,12 @@ elif plat[:5] == 'sunos':    # Solaris/SunOS (confirmed)
     def set_special_baudrate(port, baudrate):
         raise ValueError("sorry don't know how to handle non standard baud rate on this platform")
 
+    def set_low_latency_mode(port, low_latency):
+        raise ValueError("sorry don't know how to set the low latency mode on this platform")
+
+    def get_input_counters(port):
+        raise ValueError("sorry don't know how to read the interrupt counters on this platform")
+
     baudrate_constants = {}
 
 elif plat[:3] == 'aix':      # AIX
@@ -204,6 +287,12 @@ elif plat[:3] == 'aix':      # AIX
     def set_special_baudrate(port, baudrate):
         raise ValueError("sorry don't know how to handle non standard baud rate on this platform")
 
+    def set_low_latency_mode(port, low_latency):
+        raise ValueError("sorry don't know how to set the low latency mode on this platform")
+
+    def get_input_counters(port):
+        raise ValueError("sorry don't know how to read the interrupt counters on this platform")
+
     baudrate_constants = {}
 
 else:
@@ -229,6 +318,10 @@ and with a bit luck you can get this module running...
         return '/dev/ttyS%d' % portnum
     def set_special_baudrate(port, baudrate):
         raise SerialException("sorry don't know how to handle non standard baud rate on this platform")
+    def set_low_latency_mode(port, low_latency):
+        raise ValueError("sorry don't know how to set the low latency mode on this platform")
+    def get_input_counters(port):
+        raise ValueError("sorry don't know how to read the interrupt counters on this platform")
     baudrate_constants = {}
     #~ raise Exception, "this module does not run on this platform, sorry."
 
@@ -273,6 +366,18 @@ TIOCCBRK  = hasattr(TERMIOS, 'TIOCCBRK') and TERMIOS.TIOCCBRK or 0x5428
 CMSPAR = 0o10000000000 # Use "stick" (mark/space) parity
 
 
+# read from a file descriptor directly into a writable buffer, without an
+# intermediate bytes object when os.readv is available (Python 3.3+)
+if hasattr(os, 'readv'):
+    def os_readinto(fd, buf):
+        return os.readv(fd, [buf])
+else:
+    def os_readinto(fd, buf):
+        data = os.read(fd, len(buf))
+        buf[:len(data)] = data
+        return len(data)
+
+
 class PosixSerial(SerialBase):
     """\
     Serial port class POSIX implementation. Serial port configuration is 
@@ -432,8 +537,14 @@ class PosixSerial(SerialBase):
         if vtime < 0 or vtime > 255:
             raise ValueError('Invalid vtime: %r' % vtime)
         cc[TERMIOS.VTIME] = vtime
-        # activate settings
+        # activate settings. data already written is given some time to go
+        # out with the old settings first, so a reconfiguration on the open
+        # port (e.g. a baud rate switch after a bootloader command) does not
+        # garble it. TCSADRAIN is not used as it waits forever while the
+        # device holds off the output with CTS or XOFF. the input buffer is
+        # kept
         if [iflag, oflag, cflag, lflag, ispeed, ospeed, cc] != orig_attr:
+            self._waitOutputDrained(self.RECONFIGURE_DRAIN_TIMEOUT)
             termios.tcsetattr(self.fd, TERMIOS.TCSANOW, [iflag, oflag, cflag, lflag, ispeed, ospeed, cc])
 
         # apply custom baud rate, if any
@@ -446,18 +557,43 @@ class PosixSerial(SerialBase):
             if self.fd is not None:
                 os.close(self.fd)
                 self.fd = None
+            self._readAhead = b''
             self._isOpen = False
 
     def makeDeviceName(self, port):
         return device(port)
 
+    # maximum time a reconfiguration of the open port waits for the output
+    RECONFIGURE_DRAIN_TIMEOUT = 0.5
+
+    def _waitOutputDrained(self, timeout):
+        """internal - wait up to timeout seconds for the output buffer to empty"""
+        deadline = time.time() + timeout
+        while self.outWaiting() and time.time() < deadline:
+            time.sleep(0.005)
+
     #  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -
 
+    # data put back by readline(), returned before reading from the port
+    _readAhead = b''
+
     def inWaiting(self):
         """Return the number of characters currently in the input buffer."""
         #~ s = fcntl.ioctl(self.fd, TERMIOS.FIONREAD, TIOCM_zero_str)
         s = fcntl.ioctl(self.fd, TIOCINQ, TIOCM_zero_str)
-        return struct.unpack('I',s)[0]
+        return struct.unpack('I',s)[0] + len(self._readAhead)
+
+    def _unread(self, data):
+        """internal - put back data, the next read returns it first"""
+        self._readAhead = data + self._readAhead
+
+    def _readAheadInto(self, buf):
+        """internal - move put back data into buf, returns the number of bytes"""
+        n = min(len(buf), len(self._readAhead))
+        if n:
+            buf[:n] = self._readAhead[:n]
+            self._readAhead = self._readAhead[n:]
+        return n
 
     # select based implementation, proved to work on many systems
     def read(self, size=1):
@@ -466,9 +602,24 @@ class PosixSerial(SerialBase):
         return less characters as requested. With no timeout it will block
         until the requested number of bytes is read.
         """
+        read = bytearray(size)
+        n = self.readinto(read)
+        del read[n:]
+        return bytes(read)
+
+    def readinto(self, b):
+        """\
+        Read up to len(b) bytes from the serial port directly into the
+        writable buffer b (e.g. a preallocated bytearray or memoryview).
+        Same timeout behavior as read(). Returns the number of bytes read.
+        """
         if not self._isOpen: raise portNotOpenError
-        read = bytearray()
-        while len(read) < size:
+        buf = memoryview(b)
+        if buf.format != 'B' or buf.itemsize != 1:
+            buf = buf.cast('B')
+        size = len(buf)
+        n = self._readAheadInto(buf)
+        while n < size:
             try:
                 ready,_,_ = select.select([self.fd],[],[], self._timeout)
                 # If select was used with a timeout, and the timeout occurs, it
@@ -477,15 +628,15 @@ class PosixSerial(SerialBase):
                 # is nothing to read.
                 if not ready:
                     break   # timeout
-                buf = os.read(self.fd, size-len(read))
+                count = os_readinto(self.fd, buf[n:])
                 # read should always return some data as select reported it was
                 # ready to read when we get to this point.
-                if not buf:
+                if not count:
                     # Disconnected devices, at least on Linux, show the
                     # behavior that they are always ready to read immediately
                     # but reading returns nothing.
                     raise SerialException('device reports readiness to read but returned no data (device disconnected or multiple access on port?)')
-                read.extend(buf)
+                n += count
             except OSError as e:
                 # this is for Python 3.x where select.error is a subclass of OSError
                 # ignore EAGAIN errors. all other errors are shown
@@ -497,13 +648,21 @@ class PosixSerial(SerialBase):
                 # see also http://www.python.org/dev/peps/pep-3151/#select
                 if e[0] != errno.EAGAIN:
                     raise SerialException('read failed: %s' % (e,))
-        return bytes(read)
+        return n
 
     def write(self, data):
-        """Output the given string over the serial port."""
+        """\
+        Output the given string over the serial port. With a write timeout
+        of 0 it does not block, it writes what the driver accepts right now
+        and returns the number of bytes written.
+        """
         if not self._isOpen: raise portNotOpenError
-        d = to_bytes(data)
-        tx_len = len(d)
+        # slicing a memoryview does not copy the remaining data after a
+        # partial write
+        d = memoryview(to_buffer(data))
+        if d.format != 'B' or d.itemsize != 1:
+            d = d.cast('B')
+        tx_len = total = len(d)
         if self._writeTimeout is not None and self._writeTimeout > 0:
             timeout = time.time() + self._writeTimeout
         else:
@@ -511,25 +670,33 @@ class PosixSerial(SerialBase):
         while tx_len > 0:
             try:
                 n = os.write(self.fd, d)
-                if timeout:
-                    # when timeout is set, use select to wait for being ready
-                    # with the time left as timeout
-                    timeleft = timeout - time.time()
-                    if timeleft < 0:
-                        raise writeTimeoutError
-                    _, ready, _ = select.select([], [self.fd], [], timeleft)
-                    if not ready:
-                        raise writeTimeoutError
-                else:
-                    # wait for write operation
-                    _, ready, _ = select.select([], [self.fd], [], None)
-                    if not ready:
-                        raise SerialException('write failed (select)')
-                d = d[n:]
-                tx_len -= n
             except OSError as v:
                 if v.errno != errno.EAGAIN:
                     raise SerialException('write failed: %s' % (v,))
+                n = 0
+            if n:
+                d = d[n:]
+                tx_len -= n
+                if not tx_len:
+                    break   # all data accepted, no need to wait
+            if self._writeTimeout == 0:
+                # non-blocking, the driver does not take more right now
+                # (i.e. the other side stopped us with CTS or XOFF)
+                return total - tx_len
+            if timeout:
+                # when timeout is set, use select to wait for being ready
+                # with the time left as timeout
+                timeleft = timeout - time.time()
+                if timeleft < 0:
+                    raise writeTimeoutError
+                _, ready, _ = select.select([], [self.fd], [], timeleft)
+                if not ready:
+                    raise writeTimeoutError
+            else:
+                # wait until the device can accept more data
+                _, ready, _ = select.select([], [self.fd], [], None)
+                if not ready:
+                    raise SerialException('write failed (select)')
         return len(data)
 
     def flush(self):
@@ -542,6 +709,7 @@ class PosixSerial(SerialBase):
     def flushInput(self):
         """Clear input buffer, discarding all that is in the buffer."""
         if not self._isOpen: raise portNotOpenError
+        self._readAhead = b''
         termios.tcflush(self.fd, TERMIOS.TCIFLUSH)
 
     def flushOutput(self):
@@ -610,6 +778,21 @@ class PosixSerial(SerialBase):
         s = fcntl.ioctl(self.fd, TIOCMGET, TIOCM_zero_str)
         return struct.unpack('I',s)[0] & TIOCM_CD != 0
 
+    def getModemLines(self):
+        """\
+        Read all terminal status lines with a single call. Returns a
+        dictionary with the state of 'CTS', 'DSR', 'RI' and 'CD'.
+        """
+        if not self._isOpen: raise portNotOpenError
+        s = fcntl.ioctl(self.fd, TIOCMGET, TIOCM_zero_str)
+        status = struct.unpack('I',s)[0]
+        return {
+            'CTS': status & TIOCM_CTS != 0,
+            'DSR': status & TIOCM_DSR != 0,
+            'RI': status & TIOCM_RI != 0,
+            'CD': status & TIOCM_CD != 0,
+        }
+
     # - - platform specific - - - -
 
     def outWaiting(self):
@@ -618,6 +801,31 @@ class PosixSerial(SerialBase):
         s = fcntl.ioctl(self.fd, TIOCOUTQ, TIOCM_zero_str)
         return struct.unpack('I',s)[0]
 
+    def setLowLatencyMode(self, low_latency):
+        """\
+        Enable or disable the low latency mode of the driver (Linux only,
+        ASYNC_LOW_LATENCY). USB adapters such as FTDI then hand over
+        received bytes right away instead of collecting them for up to
+        16ms. Reads are already done with VMIN = VTIME = 0 and select(), so
+        nothing is held back on this side. Raises ValueError if the driver
+        does not support it.
+        WARNING: this function is not portable to different platforms!
+        """
+        if not self._isOpen: raise portNotOpenError
+        set_low_latency_mode(self, low_latency)
+
+    def getInputCounters(self):
+        """\
+        Read the driver's interrupt counters (Linux only, TIOCGICOUNT) as a
+        dictionary. Besides the modem line and rx/tx counts, 'frame',
+        'overrun', 'parity', 'brk' and 'buf_overrun' count line errors and
+        data lost in the UART or the tty buffer. Raises ValueError if the
+        driver does not support it.
+        WARNING: this function is not portable to different platforms!
+        """
+        if not self._isOpen: raise portNotOpenError
+        return get_input_counters(self)
+
     def drainOutput(self):
         """internal - not portable!"""
         if not self._isOpen: raise portNotOpenError
@@ -680,33 +888,55 @@ class PosixPollSerial(Serial):
     Poll based read implementation. Not all systems support poll properly.
     However this one has better handling of errors, such as a device
     disconnecting while it's in use (e.g. USB-serial unplugged).
+    The poll object is created once when the port is opened and reused for
+    every read.
     """
 
-    def read(self, size=1):
+    _poll = None
+
+    def open(self):
+        Serial.open(self)
+        self._poll = select.poll()
+        self._poll.register(self.fd, select.POLLIN|select.POLLERR|select.POLLHUP|select.POLLNVAL)
+
+    def close(self):
+        self._poll = None
+        Serial.close(self)
+
+    def readinto(self, b):
         """\
-        Read size bytes from the serial port. If a timeout is set it may
-        return less characters as requested. With no timeout it will block
-        until the requested number of bytes is read.
+        Read up to len(b) bytes from the serial port directly into the
+        writable buffer b. If a timeout is set it may return less characters
+        as requested. With no timeout it will block until the buffer is full.
         """
-        if self.fd is None: raise portNotOpenError
-        read = bytearray()
-        poll = select.poll()
-        poll.register(self.fd, select.POLLIN|select.POLLERR|select.POLLHUP|select.POLLNVAL)
-        if size > 0:
-            while len(read) < size:
-                # print "\tread(): size",size, "have", len(read)    #debug
-                # wait until device becomes ready to read (or something fails)
-                for fd, event in poll.poll(self._timeout*1000):
-                    if event & (select.POLLERR|select.POLLHUP|select.POLLNVAL):
-                        raise SerialException('device reports error (poll)')
-                    #  we don't care if it is select.POLLIN or timeout, that's
-                    #  handled below
-                buf = os.read(self.fd, size - len(read))
-                read.extend(buf)
-                if ((self._timeout is not None and self._timeout >= 0) or 
-                    (self._interCharTimeout is not None and self._interCharTimeout > 0)) and not buf:
-                    break   # early abort on timeout
-        return bytes(read)
+        if self.fd is None or self._poll is None: raise portNotOpenError
+        buf = memoryview(b)
+        if buf.format != 'B' or buf.itemsize != 1:
+            buf = buf.cast('B')
+        size = len(buf)
+        if self._timeout is None:
+            poll_timeout = -1
+        else:
+            poll_timeout = self._timeout * 1000
+        n = self._readAheadInto(buf)
+        while n < size:
+            # wait until device becomes ready to read (or something fails)
+            events = self._poll.poll(poll_timeout)
+            if not events:
+                break   # timeout, nothing to read
+            for fd, event in events:
+                if event & (select.POLLERR|select.POLLHUP|select.POLLNVAL):
+                    raise SerialException('device reports error (poll)')
+            try:
+                count = os_readinto(self.fd, buf[n:])
+            except OSError as e:
+                if e.errno != errno.EAGAIN:
+                    raise SerialException('read failed: %s' % (e,))
+                continue
+            if not count:
+                raise SerialException('device reports readiness to read but returned no data (device disconnected or multiple access on port?)')
+            n += count
+        return n
 
 
 if __name__ == '__main__':
@@ -71,11 +71,31 @@ def to_bytes(seq):
     elif isinstance(seq, memoryview):
         return seq.tobytes()
     else:
+        # other bytes-like objects (e.g. array.array) are copied in one go
+        try:
+            return memoryview(seq).tobytes()
+        except TypeError:
+            pass
         b = bytearray()
         for item in seq:
-            b.append(item)  # this one handles int and str for our emulation and ints for Python 3.x
+            if isinstance(item, bytes):
+                b.extend(item)  # single byte constants such as IAC
+            else:
+                b.append(item)  # this one handles int and str for our emulation and ints for Python 3.x
         return bytes(b)
 
+def to_buffer(data):
+    """\
+    return data as a bytes-like object, without copying it if it already
+    supports the buffer protocol (bytes, bytearray, memoryview, array, ...)
+    """
+    if isinstance(data, (bytes, bytearray)):
+        return data
+    try:
+        return memoryview(data)
+    except TypeError:
+        return to_bytes(data)
+
 # create control bytes
 XON  = to_bytes([17])
 XOFF = to_bytes([19])
@@ -116,7 +136,9 @@ class FileLike(object):
     This class implements readline and readlines based on read and
     writelines based on write.
     This class is used to provide the above functions for to Serial
-    port objects.
+    port objects. Serial ports use the readline of SerialBase, so
+    readlines, xreadlines and iteration read in chunks too on the ports that
+    provide _unread (posix, socket://, loop:// and rfc2217://).
 
     Note that when the serial port was opened with _NO_ timeout that
     readline blocks until it sees a newline (or the specified size is
@@ -240,6 +262,17 @@ class SerialBase(object):
     PARITIES  = (PARITY_NONE, PARITY_EVEN, PARITY_ODD, PARITY_MARK, PARITY_SPACE)
     STOPBITS  = (STOPBITS_ONE, STOPBITS_ONE_POINT_FIVE, STOPBITS_TWO)
 
+    # set while applySettingsDict() changes several settings, so the port is
+    # reconfigured once at the end instead of once per setting
+    _reconfigureDeferred = False
+
+    # implementations that can put back data so that the next read returns
+    # it provide _unread(data). readline() then reads everything that is
+    # waiting at once, otherwise it has to read byte by byte so it does not
+    # consume data after the end of the line
+    _unread = None
+    READLINE_CHUNK_SIZE = 256
+
     def __init__(self,
                  port = None,           # number of device, numbering starts at
                                         # zero. if everything fails, the user
@@ -359,7 +392,7 @@ class SerialBase(object):
             if b <= 0:
                 raise ValueError("Not a valid baudrate: %r" % (baudrate,))
             self._baudrate = b
-            if self._isOpen:  self._reconfigurePort()
+            if self._isOpen and not self._reconfigureDeferred: self._reconfigurePort()
 
     def getBaudrate(self):
         """Get the current baud rate setting."""
@@ -372,7 +405,7 @@ class SerialBase(object):
         """Change byte size."""
         if bytesize not in self.BYTESIZES: raise ValueError("Not a valid byte size: %r" % (bytesize,))
         self._bytesize = bytesize
-        if self._isOpen: self._reconfigurePort()
+        if self._isOpen and not self._reconfigureDeferred: self._reconfigurePort()
 
     def getByteSize(self):
         """Get the current byte size setting."""
@@ -385,7 +418,7 @@ class SerialBase(object):
         """Change parity setting."""
         if parity not in self.PARITIES: raise ValueError("Not a valid parity: %r" % (parity,))
         self._parity = parity
-        if self._isOpen: self._reconfigurePort()
+        if self._isOpen and not self._reconfigureDeferred: self._reconfigurePort()
 
     def getParity(self):
         """Get the current parity setting."""
@@ -398,7 +431,7 @@ class SerialBase(object):
         """Change stop bits size."""
         if stopbits not in self.STOPBITS: raise ValueError("Not a valid stop bit size: %r" % (stopbits,))
         self._stopbits = stopbits
-        if self._isOpen: self._reconfigurePort()
+        if self._isOpen and not self._reconfigureDeferred: self._reconfigurePort()
 
     def getStopbits(self):
         """Get the current stop bits setting."""
@@ -416,7 +449,7 @@ class SerialBase(object):
                 raise ValueError("Not a valid timeout: %r" % (timeout,))
             if timeout < 0: raise ValueError("Not a valid timeout: %r" % (timeout,))
         self._timeout = timeout
-        if self._isOpen: self._reconfigurePort()
+        if self._isOpen and not self._reconfigureDeferred: self._reconfigurePort()
 
     def getTimeout(self):
         """Get the current timeout setting."""
@@ -435,7 +468,7 @@ class SerialBase(object):
                 raise ValueError("Not a valid timeout: %r" % timeout)
 
         self._writeTimeout = timeout
-        if self._isOpen: self._reconfigurePort()
+        if self._isOpen and not self._reconfigureDeferred: self._reconfigurePort()
 
     def getWriteTimeout(self):
         """Get the current timeout setting."""
@@ -447,7 +480,7 @@ class SerialBase(object):
     def setXonXoff(self, xonxoff):
         """Change XON/XOFF setting."""
         self._xonxoff = xonxoff
-        if self._isOpen: self._reconfigurePort()
+        if self._isOpen and not self._reconfigureDeferred: self._reconfigurePort()
 
     def getXonXoff(self):
         """Get the current XON/XOFF setting."""
@@ -458,7 +491,7 @@ class SerialBase(object):
     def setRtsCts(self, rtscts):
         """Change RTS/CTS flow control setting."""
         self._rtscts = rtscts
-        if self._isOpen: self._reconfigurePort()
+        if self._isOpen and not self._reconfigureDeferred: self._reconfigurePort()
 
     def getRtsCts(self):
         """Get the current RTS/CTS flow control setting."""
@@ -474,7 +507,7 @@ class SerialBase(object):
         else:
             # if defined independently, follow its value
             self._dsrdtr = dsrdtr
-        if self._isOpen: self._reconfigurePort()
+        if self._isOpen and not self._reconfigureDeferred: self._reconfigurePort()
 
     def getDsrDtr(self):
         """Get the current DSR/DTR flow control setting."""
@@ -492,7 +525,7 @@ class SerialBase(object):
                 raise ValueError("Not a valid timeout: %r" % interCharTimeout)
 
         self._interCharTimeout = interCharTimeout
-        if self._isOpen: self._reconfigurePort()
+        if self._isOpen and not self._reconfigureDeferred: self._reconfigurePort()
 
     def getInterCharTimeout(self):
         """Get the current inter-character timeout setting."""
@@ -517,10 +550,27 @@ class SerialBase(object):
         apply stored settings from a dictionary returned from
         getSettingsDict. it's allowed to delete keys from the dictionary. these
         values will simply left unchanged.
+
+        on an open port all changes are applied at once with a single
+        _reconfigurePort() call, the port is not closed. if a value is
+        invalid, none of the settings are changed.
         """
-        for key in self._SETTINGS:
-            if d[key] != getattr(self, '_'+key):   # check against internal "_" value
-                setattr(self, key, d[key])          # set non "_" value to use properties write function
+        previous = self.getSettingsDict()
+        changed = False
+        self._reconfigureDeferred = True
+        try:
+            for key in self._SETTINGS:
+                if key in d and d[key] != getattr(self, '_'+key):   # check against internal "_" value
+                    setattr(self, key, d[key])          # set non "_" value to use properties write function
+                    changed = True
+        except:
+            for key, value in previous.items():
+                setattr(self, '_'+key, value)
+            raise
+        finally:
+            self._reconfigureDeferred = False
+        if changed and self._isOpen:
+            self._reconfigurePort()
 
     #  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -
 
@@ -542,6 +592,45 @@ class SerialBase(object):
         )
 
 
+    #  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -
+
+    def readline(self, size=None, eol=LF):
+        """\
+        Read a line which is terminated with end-of-line (eol) character
+        ('\n' by default) or until timeout. If the port provides _unread,
+        all bytes already waiting are read at once and the data after the end
+        of the line is kept for the next read, otherwise it reads byte by
+        byte. The timeout applies to each wait for more data, not to the
+        whole line.
+        """
+        leneol = len(eol)
+        line = bytearray()
+        start = 0
+        while True:
+            end = line.find(eol, start)
+            if end >= 0:
+                end += leneol
+            if size is not None and (end > size or (end < 0 and len(line) >= size)):
+                end = size
+            if end >= 0:
+                break
+            # the eol may be split between two reads
+            start = max(0, len(line) - leneol + 1)
+            if self._unread is None:
+                data = self.read(1)
+            else:
+                # read(1) waits for the next byte if nothing is waiting. the
+                # chunks are limited so that little is put back per line
+                data = self.read(min(max(1, self.inWaiting()), self.READLINE_CHUNK_SIZE))
+            if not data:
+                end = len(line)
+                break
+            line += data
+        if end < len(line):
+            self._unread(bytes(line[end:]))
+            del line[end:]
+        return bytes(line)
+
     #  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -
     # compatibility with io library
 
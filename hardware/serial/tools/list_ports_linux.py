@@ -11,30 +11,19 @@
 import glob
 import sys
 import os
-import re
-
-try:
-    import subprocess
-except ImportError:
-    def popen(argv):
-        try:
-            si, so =  os.popen4(' '.join(argv))
-            return so.read().strip()
-        except:
-            raise IOError('lsusb failed')
-else:
-    def popen(argv):
-        try:
-            return subprocess.check_output(argv, stderr=subprocess.STDOUT).strip()
-        except:
-            raise IOError('lsusb failed')
+import select
+import threading
+import time
+import ctypes
+import ctypes.util
 
 
 # The comports function is expected to return an iterable that yields tuples of
 # 3 strings: port name, human readable description and a hardware ID.
 #
-# as currently no method is known to get the second two strings easily, they
-# are currently just identical to the port name.
+# The descriptions are read from sysfs and cached per device. The cache is
+# invalidated when device nodes are added to or removed from /dev, which is
+# watched with inotify.
 
 # try to detect the OS so that a device can be selected...
 plat = sys.platform.lower()
@@ -52,14 +41,84 @@ def read_line(filename):
     except IOError:
         return None
 
-def re_group(regexp, text):
-    """search for regexp in text, return 1st group on match"""
-    if sys.version < '3':
-        m = re.search(regexp, text)
-    else:
-        # text is bytes-like
-        m = re.search(regexp, text.decode('ascii', 'replace'))
-    if m: return m.group(1)
+
+class DeviceWatcher(object):
+    """\
+    Watch a directory (by default /dev) for entries being created or removed,
+    using inotify. When inotify is not available or path is None, changed()
+    always reports a change so that callers fall back to re-reading
+    everything.
+    """
+
+    IN_ATTRIB = 0x00000004
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    EVENT_MASK = IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+    def __init__(self, path='/dev'):
+        self.fd = None
+        if path is None:
+            return
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        except (OSError, AttributeError):
+            return
+        if fd < 0:
+            return
+        if libc.inotify_add_watch(fd, path.encode(), self.EVENT_MASK) < 0:
+            os.close(fd)
+            return
+        self.fd = fd
+
+    def changed(self):
+        """\
+        Return True if the directory changed since the last call (or
+        always, without inotify). Does not block.
+        """
+        if self.fd is None:
+            return True
+        changed = False
+        while True:
+            try:
+                if not os.read(self.fd, 4096):
+                    break
+                changed = True
+            except OSError:
+                # EAGAIN, no more events
+                break
+        return changed
+
+    def wait(self, timeout=None):
+        """\
+        Block until the directory changes or timeout seconds passed. Returns
+        True if it changed. Without inotify this just sleeps.
+        """
+        if self.fd is None:
+            # not select() without descriptors, that fails on Windows
+            if timeout is not None:
+                time.sleep(timeout)
+            return True
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        return bool(ready) and self.changed()
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class PortInfo(object):
+    """Metadata of a serial device, as read from sysfs."""
+
+    def __init__(self, vendor=None, product=None, serial_number=None, description=None, hwid='n/a'):
+        self.vendor = vendor
+        self.product = product
+        self.serial_number = serial_number
+        self.description = description
+        self.hwid = hwid
 
 
 # try to extract descriptions from sysfs. this was done by experimenting,
@@ -67,7 +126,6 @@ def re_group(regexp, text):
 
 def usb_sysfs_hw_string(sysfs_path):
     """given a path to a usb device in sysfs, return a string describing it"""
-    bus, dev = os.path.basename(os.path.realpath(sysfs_path)).split('-')
     snr = read_line(sysfs_path+'/serial')
     if snr:
         snr_txt = ' SNR=%s' % (snr,)
@@ -79,71 +137,111 @@ def usb_sysfs_hw_string(sysfs_path):
             snr_txt
             )
 
-def usb_lsusb_string(sysfs_path):
-    base = os.path.basename(os.path.realpath(sysfs_path))
-    bus = base.split('-')[0]
-    try:
-        dev = int(read_line(os.path.join(sysfs_path, 'devnum')))
-        desc = popen(['lsusb', '-v', '-s', '%s:%s' % (bus, dev)])
-        # descriptions from device
-        iManufacturer = re_group('iManufacturer\s+\w+ (.+)', desc)
-        iProduct = re_group('iProduct\s+\w+ (.+)', desc)
-        iSerial = re_group('iSerial\s+\w+ (.+)', desc) or ''
-        # descriptions from kernel
-        idVendor = re_group('idVendor\s+0x\w+ (.+)', desc)
-        idProduct = re_group('idProduct\s+0x\w+ (.+)', desc)
-        # create descriptions. prefer text from device, fall back to the others
-        return '%s %s %s' % (iManufacturer or idVendor, iProduct or idProduct, iSerial)
-    except IOError:
-        return base
+def usb_sysfs_info(sysfs_path, interface=None):
+    """\
+    given a path to a usb device in sysfs, return a PortInfo. the strings the
+    device reports are used, they are the same ones lsusb shows.
+    """
+    info = PortInfo(
+            vendor=read_line(sysfs_path+'/manufacturer') or read_line(sysfs_path+'/idVendor'),
+            product=read_line(sysfs_path+'/product') or read_line(sysfs_path+'/idProduct'),
+            serial_number=read_line(sysfs_path+'/serial'),
+            hwid=usb_sysfs_hw_string(sysfs_path))
+    info.description = interface or ' '.join(
+            x for x in (info.vendor, info.product, info.serial_number) if x)
+    return info
+
+def sysfs_device_path(device):
+    """return the sysfs path of the device behind a tty, None if there is none"""
+    path = '/sys/class/tty/%s/device' % (os.path.basename(device),)
+    if os.path.exists(path):
+        return os.path.realpath(path)
+    return None
+
+def read_port_info(device):
+    """Read the metadata of a tty from sysfs."""
+    base = os.path.basename(device)
+    sys_dev = sysfs_device_path(device)
+    if sys_dev is None:
+        return PortInfo(description=base)
+    # USB-Serial devices: the device of the tty is a port of an interface of
+    # the usb device. USB-CDC devices: the device is the interface itself
+    interface = read_line(sys_dev + '/interface')
+    for sys_usb in (os.path.dirname(sys_dev), os.path.dirname(os.path.dirname(sys_dev))):
+        if os.path.exists(sys_usb + '/idVendor'):
+            return usb_sysfs_info(sys_usb, interface)
+    # PCI based devices
+    info = PortInfo(description=interface or base)
+    pnp_id = read_line(sys_dev + '/id')
+    if pnp_id:
+        info.hwid = pnp_id
+    return info
+
+
+class PortInfoCache(object):
+    """\
+    Port metadata keyed by the sysfs device path, and the list of ports. Both
+    are dropped when device nodes in /dev change.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._watcher = None
+        self._info = {}
+        self._ports = None
+
+    def _check(self):
+        # must be called with the lock held
+        if self._watcher is None:
+            self._watcher = DeviceWatcher('/dev')
+        if self._watcher.changed():
+            self._info = {}
+            self._ports = None
+
+    def info(self, device):
+        """return the PortInfo of a tty"""
+        key = sysfs_device_path(device) or device
+        with self._lock:
+            self._check()
+            info = self._info.get(key)
+        if info is None:
+            info = read_port_info(device)
+            with self._lock:
+                self._info[key] = info
+        return info
+
+    def comports(self):
+        """return the list of (port, description, hwid) tuples"""
+        with self._lock:
+            self._check()
+            ports = self._ports
+        if ports is None:
+            devices = glob.glob('/dev/ttyS*') + glob.glob('/dev/ttyUSB*') + glob.glob('/dev/ttyACM*')
+            ports = []
+            for d in devices:
+                info = self.info(d)
+                ports.append((d, info.description, info.hwid))
+            with self._lock:
+                self._ports = ports
+        return list(ports)
+
+
+port_info_cache = PortInfoCache()
 
 def describe(device):
     """\
     Get a human readable description.
-    For USB-Serial devices try to run lsusb to get a human readable description.
-    For USB-CDC devices read the description from sysfs.
+    For USB devices the manufacturer, product and serial strings are read
+    from sysfs, for USB-CDC devices the interface description.
     """
-    base = os.path.basename(device)
-    # USB-Serial devices
-    sys_dev_path = '/sys/class/tty/%s/device/driver/%s' % (base, base)
-    if os.path.exists(sys_dev_path):
-        sys_usb = os.path.dirname(os.path.dirname(os.path.realpath(sys_dev_path)))
-        return usb_lsusb_string(sys_usb)
-    # USB-CDC devices
-    sys_dev_path = '/sys/class/tty/%s/device/interface' % (base,)
-    if os.path.exists(sys_dev_path):
-        return read_line(sys_dev_path)
-    # USB Product Information
-    sys_dev_path = '/sys/class/tty/%s/device' % (base,)
-    if os.path.exists(sys_dev_path):
-        product_name_file = os.path.dirname(os.path.realpath(sys_dev_path)) + "/product"
-        if os.path.exists(product_name_file):
-            return read_line(product_name_file)
-    return base
+    return port_info_cache.info(device).description
 
 def hwinfo(device):
     """Try to get a HW identification using sysfs"""
-    base = os.path.basename(device)
-    if os.path.exists('/sys/class/tty/%s/device' % (base,)):
-        # PCI based devices
-        sys_id_path = '/sys/class/tty/%s/device/id' % (base,)
-        if os.path.exists(sys_id_path):
-            return read_line(sys_id_path)
-        # USB-Serial devices
-        sys_dev_path = '/sys/class/tty/%s/device/driver/%s' % (base, base)
-        if os.path.exists(sys_dev_path):
-            sys_usb = os.path.dirname(os.path.dirname(os.path.realpath(sys_dev_path)))
-            return usb_sysfs_hw_string(sys_usb)
-        # USB-CDC devices
-        if base.startswith('ttyACM'):
-            sys_dev_path = '/sys/class/tty/%s/device' % (base,)
-            if os.path.exists(sys_dev_path):
-                return usb_sysfs_hw_string(sys_dev_path + '/..')
-    return 'n/a'    # XXX directly remove these from the list?
+    return port_info_cache.info(device).hwid    # XXX remove 'n/a' from the list?
 
 def comports():
-    devices = glob.glob('/dev/ttyS*') + glob.glob('/dev/ttyUSB*') + glob.glob('/dev/ttyACM*')
-    return [(d, describe(d), hwinfo(d)) for d in devices]
+    return port_info_cache.comports()
 
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 # test
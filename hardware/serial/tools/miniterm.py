@@ -77,10 +77,16 @@ def get_help_text():
 if sys.version_info >= (3, 0):
     def character(b):
         return b.decode('latin1')
+
+    def translate(b, table):
+        return b.decode('latin1').translate(table)
 else:
     def character(b):
         return b
 
+    def translate(b, table):
+        return ''.join(map(table.__getitem__, bytearray(b)))
+
 LF = serial.to_bytes([10])
 CR = serial.to_bytes([13])
 CRLF = serial.to_bytes([13, 10])
@@ -165,6 +171,42 @@ LF_MODES = ('LF', 'CR', 'CR/LF')
 
 REPR_MODES = ('raw', 'some control', 'all control', 'hex')
 
+_reader_tables = {}
+
+def reader_table(repr_mode, convert_outgoing):
+    """\
+    Return the table that maps each received byte to the text to display
+    for the given repr mode and newline setting, or None if the data is
+    displayed as is.
+    """
+    key = (repr_mode, convert_outgoing)
+    if key not in _reader_tables:
+        table = [character(serial.to_bytes([i])) for i in range(256)]
+        if repr_mode == 0:
+            # direct output, just have to care about newline setting
+            if convert_outgoing == CONVERT_CR:
+                table[13] = '\n'
+            else:
+                table = None
+        elif repr_mode == 1:
+            # escape non-printable, let pass newlines
+            table = [repr(c)[1:-1] for c in table]
+            if convert_outgoing == CONVERT_CRLF:
+                table[10] = '\n'
+                table[13] = ''
+            elif convert_outgoing == CONVERT_LF:
+                table[10] = '\n'
+            elif convert_outgoing == CONVERT_CR:
+                table[13] = '\n'
+        elif repr_mode == 2:
+            # escape all non-printable, including newline
+            table = [repr(c)[1:-1] for c in table]
+        elif repr_mode == 3:
+            # escape everything (hexdump)
+            table = ['%02x ' % i for i in range(256)]
+        _reader_tables[key] = table
+    return _reader_tables[key]
+
 class Miniterm(object):
     def __init__(self, port, baudrate, parity, rtscts, xonxoff, echo=False, convert_outgoing=CONVERT_CRLF, repr_mode=0):
         try:
@@ -242,34 +284,20 @@ class Miniterm(object):
         """loop and copy serial->console"""
         try:
             while self.alive and self._reader_alive:
-                data = character(self.serial.read(1))
-
-                if self.repr_mode == 0:
-                    # direct output, just have to care about newline setting
-                    if data == '\r' and self.convert_outgoing == CONVERT_CR:
-                        sys.stdout.write('\n')
-                    else:
-                        sys.stdout.write(data)
-                elif self.repr_mode == 1:
-                    # escape non-printable, let pass newlines
-                    if self.convert_outgoing == CONVERT_CRLF and data in '\r\n':
-                        if data == '\n':
-                            sys.stdout.write('\n')
-                        elif data == '\r':
-                            pass
-                    elif data == '\n' and self.convert_outgoing == CONVERT_LF:
-                        sys.stdout.write('\n')
-                    elif data == '\r' and self.convert_outgoing == CONVERT_CR:
-                        sys.stdout.write('\n')
-                    else:
-                        sys.stdout.write(repr(data)[1:-1])
-                elif self.repr_mode == 2:
-                    # escape all non-printable, including newline
-                    sys.stdout.write(repr(data)[1:-1])
-                elif self.repr_mode == 3:
-                    # escape everything (hexdump)
-                    for c in data:
-                        sys.stdout.write("%s " % c.encode('hex'))
+                # wait for data, then take everything that arrived at once
+                data = self.serial.read(1)
+                if not data:
+                    continue
+                n = self.serial.inWaiting()
+                if n:
+                    data += self.serial.read(n)
+
+                # the whole chunk is converted and written in one go
+                table = reader_table(self.repr_mode, self.convert_outgoing)
+                if table is None:
+                    sys.stdout.write(character(data))
+                else:
+                    sys.stdout.write(translate(data, table))
                 sys.stdout.flush()
         except serial.SerialException as e:
             self.alive = False
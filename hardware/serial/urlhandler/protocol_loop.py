@@ -19,6 +19,7 @@ from serial.serialutil import *
 import threading
 import time
 import logging
+from collections import deque
 
 # map log level names to constants. used in fromURL()
 LOGGER_LEVELS = {
@@ -44,7 +45,14 @@ class LoopbackSerial(SerialBase):
             raise SerialException("Port is already open.")
         self.logger = None
         self.buffer_lock = threading.Lock()
-        self.loop_buffer = bytearray()
+        # signalled by write() and close() so that read() can sleep until
+        # enough data is available instead of polling the buffer
+        self.buffer_condition = threading.Condition(self.buffer_lock)
+        # the written data is kept as a queue of chunks, read() takes from
+        # the front without moving the remaining data around
+        self.loop_buffer = deque()
+        self._head_offset = 0
+        self._buffered = 0
         self.cts = False
         self.dsr = False
 
@@ -79,6 +87,9 @@ class LoopbackSerial(SerialBase):
         """Close port"""
         if self._isOpen:
             self._isOpen = False
+            # wake up readers waiting for data
+            with self.buffer_condition:
+                self.buffer_condition.notify_all()
             # in case of quick reconnects, give the server some time
             time.sleep(0.3)
 
@@ -115,8 +126,39 @@ class LoopbackSerial(SerialBase):
         if self.logger:
             # attention the logged value can differ from return value in
             # threaded environments...
-            self.logger.debug('inWaiting() -> %d' % (len(self.loop_buffer),))
-        return len(self.loop_buffer)
+            self.logger.debug('inWaiting() -> %d' % (self._buffered,))
+        return self._buffered
+
+    def _take(self, size):
+        """\
+        Remove up to size bytes from the front of the buffer and return them.
+        Must be called with buffer_lock held.
+        """
+        parts = []
+        while size > 0 and self.loop_buffer:
+            chunk = self.loop_buffer[0]
+            available = len(chunk) - self._head_offset
+            if available <= size:
+                parts.append(chunk[self._head_offset:])
+                self.loop_buffer.popleft()
+                self._head_offset = 0
+                size -= available
+                self._buffered -= available
+            else:
+                parts.append(chunk[self._head_offset:self._head_offset + size])
+                self._head_offset += size
+                self._buffered -= size
+                size = 0
+        return b''.join(parts)
+
+    def _unread(self, data):
+        """internal - put back data, the next read returns it first"""
+        with self.buffer_lock:
+            if self._head_offset:
+                self.loop_buffer[0] = self.loop_buffer[0][self._head_offset:]
+                self._head_offset = 0
+            self.loop_buffer.appendleft(data)
+            self._buffered += len(data)
 
     def read(self, size=1):
         """\
@@ -129,21 +171,16 @@ class LoopbackSerial(SerialBase):
             timeout = time.time() + self._timeout
         else:
             timeout = None
-        data = bytearray()
-        while size > 0:
-            self.buffer_lock.acquire()
-            try:
-                block = to_bytes(self.loop_buffer[:size])
-                del self.loop_buffer[:size]
-            finally:
-                self.buffer_lock.release()
-            data += block
-            size -= len(block)
-            # check for timeout now, after data has been read.
-            # useful for timeout = 0 (non blocking) read
-            if timeout and time.time() > timeout:
-                break
-        return bytes(data)
+        with self.buffer_condition:
+            while self._buffered < size and self._isOpen:
+                if timeout is None:
+                    self.buffer_condition.wait()
+                else:
+                    timeleft = timeout - time.time()
+                    if timeleft <= 0:
+                        break
+                    self.buffer_condition.wait(timeleft)
+            return self._take(size)
 
     def write(self, data):
         """\
@@ -161,11 +198,11 @@ class LoopbackSerial(SerialBase):
         if self._writeTimeout is not None and time_used_to_send > self._writeTimeout:
             time.sleep(self._writeTimeout) # must wait so that unit test succeeds
             raise writeTimeoutError
-        self.buffer_lock.acquire()
-        try:
-            self.loop_buffer += data
-        finally:
-            self.buffer_lock.release()
+        if data:
+            with self.buffer_condition:
+                self.loop_buffer.append(data)
+                self._buffered += len(data)
+                self.buffer_condition.notify_all()
         return len(data)
 
     def flushInput(self):
@@ -173,11 +210,10 @@ class LoopbackSerial(SerialBase):
         if not self._isOpen: raise portNotOpenError
         if self.logger:
             self.logger.info('flushInput()')
-        self.buffer_lock.acquire()
-        try:
-            del self.loop_buffer[:]
-        finally:
-            self.buffer_lock.release()
+        with self.buffer_condition:
+            self.loop_buffer.clear()
+            self._head_offset = 0
+            self._buffered = 0
 
     def flushOutput(self):
         """\
@@ -16,6 +16,8 @@
 # URL format:    socket://<host>:<port>[/option[/option...]]
 # options:
 # - "debug" print diagnostic messages
+# - "nodelay" disable Nagle's algorithm (TCP_NODELAY)
+# - "rcvbuf=<bytes>" size of the socket receive buffer (SO_RCVBUF)
 
 from serial.serialutil import *
 import time
@@ -32,6 +34,8 @@ LOGGER_LEVELS = {
     }
 
 POLL_TIMEOUT = 2
+# size of the chunks read from the socket with recv_into
+RECV_SIZE = 65536
 
 class SocketSerial(SerialBase):
     """Serial port implementation for plain sockets."""
@@ -45,20 +49,33 @@ class SocketSerial(SerialBase):
         if the port cannot be opened.
         """
         self.logger = None
+        self._tcp_nodelay = False
+        self._rcvbuf = None
         if self._port is None:
             raise SerialException("Port must be configured before it can be used.")
         if self._isOpen:
             raise SerialException("Port is already open.")
         try:
             # XXX in future replace with create_connection (py >=2.6)
+            address = self.fromURL(self.portstr)
             self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self._socket.connect(self.fromURL(self.portstr))
+            if self._tcp_nodelay:
+                self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            if self._rcvbuf:
+                # must be set before connecting for the TCP window to use it
+                self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self._rcvbuf)
+            self._socket.connect(address)
         except Exception as msg:
             self._socket = None
             raise SerialException("Could not open port %s: %s" % (self.portstr, msg))
 
         self._socket.settimeout(POLL_TIMEOUT) # used for write timeout support :/
 
+        # received data not yet returned by read(). it is filled with large
+        # recv_into calls through a preallocated chunk buffer
+        self._rx_data = bytearray()
+        self._rx_chunk = memoryview(bytearray(RECV_SIZE))
+
         # not that there anything to configure...
         self._reconfigurePort()
         # all things set up get, now a clean start
@@ -116,6 +133,10 @@ class SocketSerial(SerialBase):
                         self.logger = logging.getLogger('pySerial.socket')
                         self.logger.setLevel(LOGGER_LEVELS[value])
                         self.logger.debug('enabled logging')
+                    elif option == 'nodelay':
+                        self._tcp_nodelay = True
+                    elif option == 'rcvbuf':
+                        self._rcvbuf = int(value)
                     else:
                         raise ValueError('unknown option: %r' % (option,))
             # get host and port
@@ -131,10 +152,57 @@ class SocketSerial(SerialBase):
     def inWaiting(self):
         """Return the number of characters currently in the input buffer."""
         if not self._isOpen: raise portNotOpenError
-        # Poll the socket to see if it is ready for reading.
-        # If ready, at least one byte will be to read.
-        lr, lw, lx = select.select([self._socket], [], [], 0)
-        return len(lr)
+        # one non-blocking receive, so a fast sender can not keep this busy
+        self._receive(0)
+        return len(self._rx_data)
+
+    def _unread(self, data):
+        """internal - put back data, the next read returns it first"""
+        self._rx_data[:0] = data
+
+    def _receive(self, timeout):
+        """\
+        Wait up to timeout seconds (None: forever) for the socket to become
+        readable and append one chunk to the internal buffer. Returns the
+        number of bytes received, 0 on timeout and None on EOF. EOF raises
+        SerialException once all buffered data has been read.
+        """
+        try:
+            ready, _, _ = select.select([self._socket], [], [], timeout)
+            if not ready:
+                return 0
+            n = self._socket.recv_into(self._rx_chunk)
+        except socket.timeout:
+            return 0
+        except (socket.error, select.error) as e:
+            # connection fails -> terminate loop
+            raise SerialException('connection failed (%s)' % e)
+        if not n:
+            # readable but no data -> EOF (connection probably closed)
+            if not self._rx_data:
+                raise SerialException('connection closed by the remote end')
+            return None
+        self._rx_data.extend(self._rx_chunk[:n])
+        return n
+
+    def _fill(self, size):
+        """\
+        Receive into the internal buffer until it holds size bytes, the read
+        timeout expired or the connection was closed.
+        """
+        if self._timeout is not None:
+            timeout = time.time() + self._timeout
+        else:
+            timeout = None
+        while len(self._rx_data) < size:
+            if timeout is None:
+                timeleft = None
+            else:
+                timeleft = max(timeout - time.time(), 0)
+            if not self._receive(timeleft):
+                break   # timeout or EOF
+            if timeleft == 0:
+                break
 
     def read(self, size=1):
         """\
@@ -143,31 +211,25 @@ class SocketSerial(SerialBase):
         until the requested number of bytes is read.
         """
         if not self._isOpen: raise portNotOpenError
-        data = bytearray()
-        if self._timeout is not None:
-            timeout = time.time() + self._timeout
-        else:
-            timeout = None
-        while len(data) < size and (timeout is None or time.time() < timeout):
-            try:
-                # an implementation with internal buffer would be better
-                # performing...
-                t = time.time()
-                block = self._socket.recv(size - len(data))
-                duration = time.time() - t
-                if block:
-                    data.extend(block)
-                else:
-                    # no data -> EOF (connection probably closed)
-                    break
-            except socket.timeout:
-                # just need to get out of recv from time to time to check if
-                # still alive
-                continue
-            except socket.error as e:
-                # connection fails -> terminate loop
-                raise SerialException('connection failed (%s)' % e)
-        return bytes(data)
+        self._fill(size)
+        data = bytes(self._rx_data[:size])
+        del self._rx_data[:size]
+        return data
+
+    def readinto(self, b):
+        """\
+        Read up to len(b) bytes into the writable buffer b. Same timeout
+        behavior as read(). Returns the number of bytes read.
+        """
+        if not self._isOpen: raise portNotOpenError
+        buf = memoryview(b)
+        if buf.format != 'B' or buf.itemsize != 1:
+            buf = buf.cast('B')
+        self._fill(len(buf))
+        n = min(len(buf), len(self._rx_data))
+        buf[:n] = self._rx_data[:n]
+        del self._rx_data[:n]
+        return n
 
     def write(self, data):
         """\
@@ -177,7 +239,7 @@ class SocketSerial(SerialBase):
         """
         if not self._isOpen: raise portNotOpenError
         try:
-            self._socket.sendall(to_bytes(data))
+            self._socket.sendall(to_buffer(data))
         except socket.error as e:
             # XXX what exception if socket connection fails
             raise SerialException("socket connection failed: %s" % e)
@@ -186,8 +248,9 @@ class SocketSerial(SerialBase):
     def flushInput(self):
         """Clear input buffer, discarding all that is in the buffer."""
         if not self._isOpen: raise portNotOpenError
-        if self.logger:
-            self.logger.info('ignored flushInput')
+        # only data already received is discarded, there is no way to tell
+        # the remote end to purge its buffers
+        del self._rx_data[:]
 
     def flushOutput(self):
         """\
@@ -258,7 +321,11 @@ class SocketSerial(SerialBase):
 
     # works on Linux and probably all the other POSIX systems
     def fileno(self):
-        """Get the file handle of the underlying socket for use with select"""
+        """\
+        Get the file handle of the underlying socket for use with select.
+        Data may already be waiting in the internal buffer when the socket
+        is not readable, check inWaiting() before waiting for the handle.
+        """
         return self._socket.fileno()
 
 
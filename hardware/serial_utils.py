@@ -1,17 +1,97 @@
+import os
 import sys
 import glob
+from concurrent.futures import ThreadPoolExecutor, wait
 from serial import Serial, SerialException
 
+SYSFS_TTY = "/sys/class/tty"
+
+# Maximum time to wait for the legacy ttyS ports that sysfs can't tell apart, unused ones can hang in open()
+PROBE_TIMEOUT = 0.25
+MAX_PROBE_THREADS = 16
+
+
+def _read_sysfs(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except (IOError, OSError):
+        return None
+
+
+def _sysfs_ports():
+    """
+    Finds the serial devices on Linux using sysfs, without opening them
+
+    :return: tuple of the ports that are serial devices, and the ports that can only be checked by opening them
+    """
+    ports = []
+    ambiguous = []
+    for name in os.listdir(SYSFS_TTY):
+        # Virtual consoles, ptys etc. are not backed by a device
+        if not os.path.exists(os.path.join(SYSFS_TTY, name, "device")):
+            continue
+        port = "/dev/" + name
+        if not os.access(port, os.R_OK | os.W_OK):
+            continue
+        # UART drivers report the port type, 0 means no UART was detected (i.e. unused legacy ttyS ports)
+        port_type = _read_sysfs(os.path.join(SYSFS_TTY, name, "type"))
+        if port_type is not None:
+            if port_type != "0":
+                ports.append(port)
+        elif name.startswith("ttyS"):
+            ambiguous.append(port)
+        else:
+            ports.append(port)
+    return ports, ambiguous
+
+
+def _probe(port):
+    try:
+        s = Serial(port)
+        s.close()
+        return True
+    except (OSError, SerialException):
+        return False
+
+
+def _probe_ports(ports, timeout=None):
+    """
+    Opens the ports in parallel to check which exist
+
+    :param timeout: optional time to wait for the probes, ports that don't answer in time are skipped
+    :return: the ports that could be opened
+    """
+    if not ports:
+        return []
+    executor = ThreadPoolExecutor(max_workers=min(len(ports), MAX_PROBE_THREADS))
+    futures = [executor.submit(_probe, port) for port in ports]
+    done, not_done = wait(futures, timeout=timeout)
+    # Probes that haven't started must not open ports after the list was returned.
+    # Don't wait for probes stuck in open()
+    for future in not_done:
+        future.cancel()
+    executor.shutdown(wait=False)
+    return [port for port, future in zip(ports, futures) if future in done and future.result()]
+
 
 # From http://stackoverflow.com/questions/12090503/listing-available-com-ports-with-python
 def list_ports(exclude=[]):
     """
-    Lists serial port names
+    Lists serial port names.
+    On Linux the ports are found in sysfs and only the ones that can't be identified there are opened,
+    on other platforms all candidates are opened in parallel
 
     :param exclude: The list of serial port names not to test
     :raises EnvironmentError: On unsupported or unknown platforms
     :returns: A list of the serial ports available on the system
     """
+    if sys.platform.startswith('linux') and os.path.isdir(SYSFS_TTY):
+        ports, ambiguous = _sysfs_ports()
+        ports = [p for p in ports if p not in exclude]
+        ports += _probe_ports([p for p in ambiguous if p not in exclude], PROBE_TIMEOUT)
+        return sorted(ports)
+
     if sys.platform.startswith('win'):
         ports = ['COM%s' % (i + 1) for i in range(256)]
     elif sys.platform.startswith('linux') or sys.platform.startswith('cygwin'):
@@ -22,14 +102,65 @@ def list_ports(exclude=[]):
     else:
         raise EnvironmentError('Unsupported platform')
 
-    result = []
-    for port in ports:
-        if port in exclude:
-            continue
-        try:
-            s = Serial(port)
-            s.close()
-            result.append(port)
-        except (OSError, SerialException):
-            pass
-    return result
+    return _probe_ports([p for p in ports if p not in exclude])
+
+
+def describe_ports(ports):
+    """
+    Gets human readable descriptions of the ports, i.e. the USB manufacturer and product.
+    On Linux the descriptions come from the cached sysfs metadata
+
+    :param ports: the port names to describe
+    :returns: dict of port name to description, for the ports that have one
+    """
+    if sys.platform.startswith('linux'):
+        from serial.tools.list_ports_linux import port_info_cache
+        descriptions = {}
+        for port in ports:
+            if port.startswith("/dev/"):
+                descriptions[port] = port_info_cache.info(port).description
+        return descriptions
+
+    from serial.tools.list_ports import comports
+    return {port: desc for port, desc, hwid in comports() if port in ports}
+
+
+def port_hardware_id(port):
+    """
+    Gets the hardware ID of a USB serial port, i.e. "USB VID:PID=0403:6001 SNR=A1B2C3"
+
+    :returns: the hardware ID, or None if the port isn't a USB device or the platform isn't supported
+    """
+    if not sys.platform.startswith('linux') or not port.startswith("/dev/"):
+        return None
+    from serial.tools.list_ports_linux import port_info_cache
+    hwid = port_info_cache.info(port).hwid
+    return hwid if hwid.startswith("USB") else None
+
+
+def find_port_by_hardware_id(hwid):
+    """
+    Finds the port of a USB device by its hardware ID, for devices that came back under a different name.
+    Only IDs that include a serial number are matched since identical adapters can't be told apart otherwise
+
+    :returns: the port name, or None if not found
+    """
+    if not hwid or "SNR=" not in hwid or not sys.platform.startswith('linux'):
+        return None
+    from serial.tools.list_ports_linux import comports
+    for port, desc, port_hwid in comports():
+        if port_hwid == hwid:
+            return port
+    return None
+
+
+def device_watcher(path='/dev'):
+    """
+    Creates a watcher for serial devices being added or removed.  Uses inotify on /dev where available,
+    otherwise its wait() just sleeps for the timeout
+
+    :param path: the directory to watch, or None to only sleep
+    :rtype: serial.tools.list_ports_linux.DeviceWatcher
+    """
+    from serial.tools.list_ports_linux import DeviceWatcher
+    return DeviceWatcher(path)
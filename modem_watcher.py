@@ -0,0 +1,63 @@
+import threading
+import time
+
+import logger
+
+log = logger.get()
+
+
+class ModemLineWatcher(threading.Thread):
+    """
+    Thread that watches the modem status lines (CTS, DSR, RI and CD) and reports each change with the time it
+    was seen, which is up to POLL_INTERVAL after the change.  All lines are read with a single call every
+    POLL_INTERVAL, plus one for the change counters where the driver keeps them (Linux), so short pulses between
+    two reads are reported too.
+
+    The watcher never blocks in the driver so stopping it doesn't hold up closing the port
+    """
+    LINES = ["CTS", "DSR", "RI", "CD"]
+    POLL_INTERVAL = 0.01
+
+    def __init__(self, stream, on_change):
+        """
+        :param stream: the open stream to watch
+        :type stream: stream.AbstractStream
+        :param on_change: function that takes the time of the change, a dict of line name to state,
+                          and the list of the lines that changed.  Called from this thread
+        """
+        super(ModemLineWatcher, self).__init__(name="ModemLines-{}".format(stream.name))
+        self.daemon = True
+        self.stream = stream
+        self.on_change = on_change
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        """
+        Stops the watcher, returns once it stopped reading the port
+        """
+        self._stop_event.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join()
+
+    def run(self):
+        try:
+            state = self.stream.modem_lines()
+            counts = self.stream.modem_change_counts()
+            while not self._stop_event.wait(self.POLL_INTERVAL):
+                lines = self.stream.modem_lines()
+                now = time.time()
+                new_counts = self.stream.modem_change_counts() if counts is not None else None
+                changed = []
+                for line in self.LINES:
+                    # A pulse (i.e. RI) may be over by the time the lines are read, the driver still counted it
+                    if lines[line] != state[line] or (new_counts is not None and new_counts[line] != counts[line]):
+                        changed.append(line)
+                state = lines
+                counts = new_counts
+                if changed:
+                    self.on_change(now, lines, changed)
+        except ValueError as e:
+            log.info("Modem line events not available for {}: {}".format(self.stream.name, e))
+        except OSError as e:
+            # The port was closed or the device disconnected
+            log.debug("Stopped watching modem lines of {}: {}".format(self.stream.name, e))
@@ -0,0 +1,346 @@
+import select
+import socket
+import threading
+import time
+from collections import deque
+
+import logger
+from hardware.serial import rfc2217
+
+log = logger.get()
+
+
+class _ShareClient(object):
+    def __init__(self, server, sock, address):
+        """
+        :type server: PortShareServer
+        :type sock: socket.socket
+        """
+        self.server = server
+        self.sock = sock
+        self.address = address
+        # Chunks waiting to be sent.  The chunks are the same bytes objects queued for every other client
+        self.pending = deque()
+        self.pending_bytes = 0
+        # Number of bytes of pending[0] that have already been sent
+        self.offset = 0
+        self.overflow = False
+        self.port_manager = None
+
+    def write(self, data):
+        """
+        Queues data for this client only.  Used by the PortManager for Telnet/RFC 2217 answers
+        """
+        self.server.queue(self, bytes(data))
+
+
+class PortRequest(object):
+    """
+    A change of the shared port's settings or control lines requested by a client, to be made by the thread that
+    owns the port with apply()
+    """
+    def __init__(self, method, args):
+        """
+        :param method: name of the method of the serial port to call
+        :type method: str
+        :param args: the arguments of the call
+        :type args: tuple
+        """
+        self.method = method
+        self.args = args
+        self.error = None
+        self.done = threading.Event()
+
+    def apply(self, serial_port):
+        try:
+            getattr(serial_port, self.method)(*self.args)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done.set()
+
+
+class _RequestingPort(object):
+    """
+    Stands in for the serial port in the PortManagers.  Setting and control line changes are handed over as
+    PortRequests and this waits for them to be applied, so the port is only changed by the thread reading it.
+    Everything else goes to the port directly
+    """
+    SETTINGS = ["baudrate", "bytesize", "parity", "stopbits", "xonxoff", "rtscts"]
+    METHODS = ["setBreak", "setDTR", "setRTS", "flushInput", "flushOutput"]
+    REQUEST_TIMEOUT = 2.0
+
+    def __init__(self, serial_port, on_request):
+        """
+        :type serial_port: serial.SerialBase
+        :param on_request: function that takes a PortRequest to apply
+        """
+        self.__dict__["_serial_port"] = serial_port
+        self.__dict__["_on_request"] = on_request
+
+    def __getattr__(self, name):
+        if name in self.METHODS:
+            return lambda *args: self._request(name, args)
+        return getattr(self._serial_port, name)
+
+    def __setattr__(self, name, value):
+        if name in self.SETTINGS:
+            self._request("applySettingsDict", ({name: value},))
+        else:
+            setattr(self._serial_port, name, value)
+
+    def _request(self, method, args):
+        request = PortRequest(method, args)
+        self._on_request(request)
+        if not request.done.wait(self.REQUEST_TIMEOUT):
+            # The PortManager handles ValueErrors of the settings by restoring the previous value
+            raise ValueError("the port didn't apply {} in time".format(method))
+        if request.error:
+            raise request.error
+
+
+def _loopback_pair():
+    """
+    Creates a pair of connected TCP sockets on localhost.  Unlike socket.socketpair() it's available everywhere
+    """
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        listener.bind(("127.0.0.1", 0))
+        listener.listen(1)
+        client = socket.create_connection(listener.getsockname())
+        server, _ = listener.accept()
+    finally:
+        listener.close()
+    return server, client
+
+
+class PortShareServer(threading.Thread):
+    """
+    Thread that shares an open port with other local tools over TCP.
+    Every chunk received on the port is broadcast to all connected clients and data sent by the clients is
+    handed to a callback to be written to the port.  In RFC 2217 mode each client gets its own PortManager so
+    it can also read and change the port settings and control lines.
+
+    Clients are served with non-blocking sockets from this thread only.  A client that can't keep up is
+    disconnected once too much data is queued for it, so a slow client never stalls the serial monitor.
+    Changes of the port settings are handed to the thread reading the port as PortRequests
+    """
+    PROTOCOL_TCP = "tcp"
+    PROTOCOL_RFC2217 = "rfc2217"
+    PROTOCOLS = [PROTOCOL_TCP, PROTOCOL_RFC2217]
+
+    # Maximum number of bytes queued for a client before it is disconnected
+    MAX_PENDING = 1024 * 1024
+    RECV_SIZE = 16384
+    MODEM_POLL_INTERVAL = 1.0
+
+    def __init__(self, serial_port, port, on_receive, on_request, protocol=PROTOCOL_TCP, host="127.0.0.1"):
+        """
+        :param serial_port: the serial port being shared.  Only used in RFC 2217 mode
+        :type serial_port: serial.SerialBase
+        :param port: the TCP port to listen on
+        :type port: int
+        :param on_receive: function that takes the bytes received from a client, to write them to the serial port
+        :param on_request: function that takes a PortRequest, to apply it to the serial port.  Only used in
+                           RFC 2217 mode
+        :param protocol: PROTOCOL_TCP for raw data or PROTOCOL_RFC2217
+        :type protocol: str
+        :param host: the address to listen on.  Defaults to local connections only
+        :type host: str
+        """
+        if protocol not in self.PROTOCOLS:
+            raise ValueError("Unknown share protocol '{}', expected one of {}".format(protocol, self.PROTOCOLS))
+        super(PortShareServer, self).__init__(name="Share-{}".format(port))
+        self.daemon = True
+        self.serial_port = _RequestingPort(serial_port, on_request)
+        self.on_receive = on_receive
+        self.protocol = protocol
+        self.running = False
+        self._clients = {}
+        self._lock = threading.Lock()
+
+        self._listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self._listener.bind((host, port))
+            self._listener.listen(5)
+            self._listener.setblocking(False)
+        except OSError:
+            self._listener.close()
+            raise
+        # Wakes up select() when data was queued from another thread
+        try:
+            self._wakeup_read, self._wakeup_write = _loopback_pair()
+        except OSError:
+            self._listener.close()
+            raise
+        self._wakeup_read.setblocking(False)
+        self._wakeup_write.setblocking(False)
+
+    @property
+    def address(self):
+        """
+        :return: the (host, port) the server is listening on
+        """
+        return self._listener.getsockname()
+
+    def broadcast(self, data):
+        """
+        Queues data received on the serial port for all clients.  Never blocks on the clients
+
+        :param data: the data received
+        :type data: bytes
+        """
+        if not self._clients:
+            return
+        if self.protocol == self.PROTOCOL_RFC2217 and rfc2217.IAC in data:
+            # Escaped once here instead of once per client
+            data = data.replace(rfc2217.IAC, rfc2217.IAC_DOUBLED)
+        with self._lock:
+            for client in self._clients.values():
+                self._queue(client, data)
+        self._wakeup()
+
+    def queue(self, client, data):
+        """
+        Queues data for a single client
+        """
+        with self._lock:
+            self._queue(client, data)
+        self._wakeup()
+
+    def stop(self):
+        self.running = False
+        self._wakeup()
+
+    def run(self):
+        self.running = True
+        last_modem_check = time.time()
+        try:
+            while self.running:
+                self._disconnect_overflowed()
+                readers = [self._listener, self._wakeup_read] + list(self._clients)
+                writers = [sock for sock, client in list(self._clients.items()) if client.pending]
+                readable, writable, _ = select.select(readers, writers, [], self.MODEM_POLL_INTERVAL)
+                for sock in readable:
+                    if sock is self._listener:
+                        self._accept()
+                    elif sock is self._wakeup_read:
+                        self._drain_wakeup()
+                    elif sock in self._clients:
+                        self._receive(self._clients[sock])
+                for sock in writable:
+                    # The client may have been disconnected while reading
+                    if sock in self._clients:
+                        self._send(self._clients[sock])
+
+                now = time.time()
+                if self.protocol == self.PROTOCOL_RFC2217 and now - last_modem_check >= self.MODEM_POLL_INTERVAL:
+                    last_modem_check = now
+                    self._check_modem_lines()
+        except Exception as e:
+            log.exception(e)
+        finally:
+            for client in list(self._clients.values()):
+                self._disconnect(client)
+            self._listener.close()
+            self._wakeup_read.close()
+            self._wakeup_write.close()
+
+    def _queue(self, client, data):
+        # Must be called with the lock held
+        if client.overflow:
+            return
+        if client.pending_bytes + len(data) > self.MAX_PENDING:
+            client.overflow = True
+            return
+        client.pending.append(data)
+        client.pending_bytes += len(data)
+
+    def _wakeup(self):
+        try:
+            self._wakeup_write.send(b"\0")
+        except (BlockingIOError, OSError):
+            # Already has a wakeup pending or the server is shutting down
+            pass
+
+    def _drain_wakeup(self):
+        try:
+            while self._wakeup_read.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def _disconnect_overflowed(self):
+        for client in list(self._clients.values()):
+            if client.overflow:
+                log.warning("Disconnecting share client {}: not reading fast enough".format(client.address))
+                self._disconnect(client)
+
+    def _accept(self):
+        try:
+            sock, address = self._listener.accept()
+        except BlockingIOError:
+            return
+        sock.setblocking(False)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        client = _ShareClient(self, sock, address)
+        with self._lock:
+            self._clients[sock] = client
+        log.info("Share client connected: {}".format(address))
+        if self.protocol == self.PROTOCOL_RFC2217:
+            # Sends the initial Telnet/RFC 2217 negotiation to the client
+            client.port_manager = rfc2217.PortManager(self.serial_port, client)
+
+    def _disconnect(self, client):
+        with self._lock:
+            self._clients.pop(client.sock, None)
+        client.sock.close()
+        log.info("Share client disconnected: {}".format(client.address))
+
+    def _receive(self, client):
+        try:
+            data = client.sock.recv(self.RECV_SIZE)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self._disconnect(client)
+            return
+        if client.port_manager:
+            try:
+                data = client.port_manager.filter(data)
+            except ValueError as e:
+                # i.e. a setting the port didn't apply in time, the client can retry
+                log.warning("Share client {}: {}".format(client.address, e))
+                return
+        if data:
+            self.on_receive(data)
+
+    def _send(self, client):
+        while client.pending:
+            chunk = client.pending[0]
+            try:
+                sent = client.sock.send(memoryview(chunk)[client.offset:])
+            except BlockingIOError:
+                return
+            except OSError:
+                self._disconnect(client)
+                return
+            client.offset += sent
+            if client.offset < len(chunk):
+                return
+            with self._lock:
+                client.pending.popleft()
+                client.pending_bytes -= len(chunk)
+                client.offset = 0
+
+    def _check_modem_lines(self):
+        for client in list(self._clients.values()):
+            try:
+                client.port_manager.check_modem_lines()
+            except Exception as e:
+                # The port may be closing or not support reading the lines
+                log.debug("Unable to check modem lines: {}".format(e))
+                continue
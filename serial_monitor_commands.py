@@ -1,5 +1,6 @@
 import sys
 import os
+import re
 import time
 import sublime
 import sublime_plugin
@@ -10,6 +11,8 @@ import logger
 import serial_monitor_thread
 from serial_settings import SerialSettings
 from filter.serial_filter import FilterFile, FilterException
+from filter.demux import ChannelDemux
+from port_share import PortShareServer
 from . import command_history_event_listener
 
 from hardware import serial, hardware_factory
@@ -17,14 +20,17 @@ from stream.serial_text_stream import SerialTextStream
 import serial_constants
 
 # List of baud rates to choose from when opening a serial port
-BAUD_RATES = ["9600", "19200", "38400", "57600", "115200"]
+BAUD_RATES = ["9600", "19200", "38400", "57600", "115200", "230400", "460800", "500000", "576000", "921600",
+              "1000000", "1500000", "2000000", "3000000", "4000000", "6000000", "8000000", "12000000"]
+# Entry at the end of the baud rate list to enter any other rate
+CUSTOM_BAUD_RATE = "Custom..."
 
 
 class SerialOptionSelector(object):
     """
     Class that helps select items from Sublime's drop-down menu
     """
-    def __init__(self, items, header=None):
+    def __init__(self, items, header=None, details=None):
         """
         Creates the selector to show the items and header given
 
@@ -32,11 +38,18 @@ class SerialOptionSelector(object):
         :type items: list or tuple of strings
         :param header: optional non-selectable item to be shown as the first entry in the list
         :type header: str
+        :param details: optional second line of text to show under each item
+        :type details: list of str
         """
-        self.items = items.copy()
+        self.items = list(items)
         self.header = header
         if header:
             self.items.insert(0, header)
+        self.panel_items = self.items
+        if details:
+            self.panel_items = [[item, detail] for item, detail in zip(items, details)]
+            if header:
+                self.panel_items.insert(0, [header, ""])
 
     def show(self, callback, starting_index=0):
         """
@@ -67,7 +80,7 @@ class SerialOptionSelector(object):
 
             callback(item, selected_index)
 
-        sublime.active_window().show_quick_panel(self.items, item_selected, flags=sublime.KEEP_OPEN_ON_FOCUS_LOST, selected_index=starting_index)
+        sublime.active_window().show_quick_panel(self.panel_items, item_selected, flags=sublime.KEEP_OPEN_ON_FOCUS_LOST, selected_index=starting_index)
 
 
 class SerialMonitorCommand(sublime_plugin.ApplicationCommand):
@@ -104,6 +117,7 @@ class SerialMonitorCommand(sublime_plugin.ApplicationCommand):
             "line_endings":      self._select_port_wrapper(self.line_endings, self.PortListType.OPEN),
             "local_echo":        self._select_port_wrapper(self.local_echo, self.PortListType.OPEN),
             "filter":            self._select_port_wrapper(self.filter, self.PortListType.OPEN),
+            "demux":             self._select_port_wrapper(self.demux, self.PortListType.OPEN),
             "_port_closed":      self.disconnected
         }
         self.open_ports = {}
@@ -150,12 +164,7 @@ class SerialMonitorCommand(sublime_plugin.ApplicationCommand):
             return
 
         baud = self.last_settings.get("baud", 9600)
-        index = -1
-        if baud in BAUD_RATES:
-            index = BAUD_RATES.index(str(baud))
-
-        selector = SerialOptionSelector(BAUD_RATES, "Select Baud Rate:")
-        selector.show(baud_selected, index)
+        self._select_baud_rate(baud_selected, baud)
 
     def disconnect(self, command_args):
         """
@@ -317,7 +326,6 @@ class SerialMonitorCommand(sublime_plugin.ApplicationCommand):
         sm_thread = self.open_ports[command_args.comport]
 
         s = serial.SerialBase()
-        baud_list = [b[0] for b in s.getSupportedBaudrates()]
         data_bits_list = [b[0] for b in s.getSupportedByteSizes()]
         stop_bits_list = [b[0] for b in s.getSupportedStopbits()]
         parity_list = s.getSupportedParities()
@@ -353,9 +361,7 @@ class SerialMonitorCommand(sublime_plugin.ApplicationCommand):
             selector = SerialOptionSelector(data_bits_list, "Select Data Bits:")
             selector.show(data_bits_selected, index)
 
-        index = self._get_index_or_default(baud_list, str(config.baud))
-        selector = SerialOptionSelector(baud_list, "Select Baud Rate:")
-        selector.show(baud_selected, index)
+        self._select_baud_rate(baud_selected, config.baud)
 
     def filter(self, command_args):
         """
@@ -381,6 +387,26 @@ class SerialMonitorCommand(sublime_plugin.ApplicationCommand):
         else:
             self._select_filtering_file(command_args)
 
+    def demux(self, command_args):
+        """
+        Handler for the "demux" command.
+        Is wrapped in the _select_port_wrapper to get the comport from the user
+
+        :param command_args: The info of the port to configure
+        :type command_args: SerialSettings
+        """
+        choice_list = ["Disable", "Enable"]
+
+        def _demux_selected(item, selected_index):
+            self.logger.debug("Setting channel demux to {}".format(item))
+            self._set_demux(command_args, selected_index)
+
+        if command_args.enable_demux is not None:
+            self._set_demux(command_args, command_args.enable_demux)
+        else:
+            selector = SerialOptionSelector(choice_list, "Channel Demux:")
+            selector.show(_demux_selected)
+
     def local_echo(self, command_args):
         """
         Handler for the "local_echo" command.
@@ -401,6 +427,35 @@ class SerialMonitorCommand(sublime_plugin.ApplicationCommand):
             selector = SerialOptionSelector(choice_list, "Local Echo:")
             selector.show(_echo_selected)
 
+    def _select_baud_rate(self, callback, current=None):
+        """
+        Shows the list of baud rates, with an entry at the end to enter a custom rate
+
+        :param callback: function to call with the baud rate selected as a string and its index in the list,
+                         or -1 for a custom rate
+        :param current: the baud rate to highlight initially
+        """
+        def _custom_entered(text):
+            try:
+                baud = int(text)
+                if baud <= 0:
+                    raise ValueError
+            except ValueError:
+                sublime.message_dialog("Invalid baud rate: {}".format(text))
+                self._select_baud_rate(callback, current)
+                return
+            callback(str(baud), -1)
+
+        def _baud_selected(baud, index):
+            if baud == CUSTOM_BAUD_RATE:
+                sublime.active_window().show_input_panel("Baud Rate:", str(current or ""), _custom_entered, None, None)
+            else:
+                callback(baud, index)
+
+        index = self._get_index_or_default(BAUD_RATES, str(current), -1)
+        selector = SerialOptionSelector(BAUD_RATES + [CUSTOM_BAUD_RATE], "Select Baud Rate:")
+        selector.show(_baud_selected, index)
+
     def _get_index_or_default(self, items, item, default=0):
         """
         Helper function to get the index of an item in a list, or return a default index if it's not there
@@ -432,6 +487,9 @@ class SerialMonitorCommand(sublime_plugin.ApplicationCommand):
             if list_type == self.PortListType.AVAILABLE:
                 # Get a list of the available ports that aren't currently open
                 port_list = [c for c in hardware_factory.list_serial_ports(exclude=open_port_names) if c not in self.open_ports]
+                # Network and URL ports from the settings, opened through serial_for_url
+                settings = sublime.load_settings(SerialSettings.SETTINGS_FILE)
+                port_list += [u for u in settings.get("url_ports", []) if u not in self.open_ports]
             else:
                 port_list = open_port_names
 
@@ -464,7 +522,11 @@ class SerialMonitorCommand(sublime_plugin.ApplicationCommand):
                 command_args.comport = selected_comport
                 _port_assigned()
 
-            selector = SerialOptionSelector(command_args.port_list, "Select Port:")
+            descriptions = hardware_factory.describe_serial_ports(command_args.port_list)
+            details = None
+            if descriptions:
+                details = [descriptions.get(port, "") for port in command_args.port_list]
+            selector = SerialOptionSelector(command_args.port_list, "Select Port:", details)
             selector.show(_port_selected, index)
 
         return wrapper
@@ -478,6 +540,9 @@ class SerialMonitorCommand(sublime_plugin.ApplicationCommand):
 
         :return: The newly created view
         """
+        if hardware_factory.is_url(comport):
+            # Keep URLs such as rfc2217://host:port readable as a view name
+            comport = re.sub(r"[:/]+", "_", comport)
         filename = "{0}_{1}_{2}.txt".format(comport.replace("/dev/", "", 1), suffix, time.strftime("%m-%d-%y_%H-%M-%S", time.localtime()))
         if window.num_groups() > 1:
             window.focus_group(1)
@@ -494,6 +559,35 @@ class SerialMonitorCommand(sublime_plugin.ApplicationCommand):
                 default_value = getattr(self.default_settings, attr)
                 setattr(command_args, attr, default_value)
 
+    def _set_demux(self, command_args, enabled):
+        """
+        Enables or disables routing tagged lines of the port to per-channel views
+
+        :param command_args: The info of the port to configure
+        :type command_args: SerialSettings
+        :param enabled: True to enable, False to disable
+        """
+        sm_thread = self.open_ports[command_args.comport]
+        if not enabled:
+            sm_thread.set_demux(None)
+            return
+
+        self._merge_args_with_defaults(command_args)
+        auto_create = command_args.demux_auto_create is None or command_args.demux_auto_create
+        window = sublime.active_window()
+        comport = command_args.comport
+
+        def _create_channel_view(channel):
+            return self._create_new_view(window, comport, channel)
+
+        try:
+            demux = ChannelDemux(_create_channel_view, command_args.demux_pattern, auto_create,
+                                 command_args.demux_channels or [])
+        except (re.error, ValueError) as e:
+            sublime.message_dialog("Invalid demux pattern \"{}\": {}".format(command_args.demux_pattern, e))
+            return
+        sm_thread.set_demux(demux)
+
     def _create_port(self, command_args):
         """
         Creates and starts a SerialMonitorThread with the port info given
@@ -502,6 +596,7 @@ class SerialMonitorCommand(sublime_plugin.ApplicationCommand):
         :type command_args: SerialSettings
         """
         self.logger.info("Creating serial port: {}, baud: {}".format(command_args.comport, command_args.baud))
+        self._merge_args_with_defaults(command_args)
         stream = SerialTextStream(command_args)
 
         window = sublime.active_window()
@@ -509,16 +604,43 @@ class SerialMonitorCommand(sublime_plugin.ApplicationCommand):
 
         sm_thread = serial_monitor_thread.SerialMonitor(stream, view, window)
 
-        self._merge_args_with_defaults(command_args)
         sm_thread.enable_timestamps(command_args.enable_timestamps)
         sm_thread.set_line_endings(command_args.line_endings)
         sm_thread.set_local_echo(command_args.local_echo)
+        sm_thread.set_auto_reconnect(command_args.auto_reconnect)
+        sm_thread.set_report_line_errors(command_args.report_line_errors)
+        sm_thread.set_modem_events(command_args.modem_events)
 
         self.open_ports[command_args.comport] = sm_thread
+        if command_args.enable_demux:
+            self._set_demux(command_args, True)
+        if command_args.share_port:
+            self._share_port(command_args, stream, sm_thread)
         sm_thread.start()
 
         sublime.status_message("Starting serial monitor on {0}".format(command_args.comport))
 
+    def _share_port(self, command_args, stream, sm_thread):
+        """
+        Sets up the server sharing the port with other tools on localhost
+
+        :param command_args: The info of the port to share
+        :type command_args: SerialSettings
+        :type stream: SerialTextStream
+        :type sm_thread: serial_monitor_thread.SerialMonitor
+        """
+        protocol = command_args.share_protocol or PortShareServer.PROTOCOL_TCP
+        try:
+            server = PortShareServer(stream.serial, int(command_args.share_port), sm_thread.write_data,
+                                     sm_thread.request_port_change, protocol)
+        except (ValueError, OSError) as e:
+            sublime.message_dialog("Unable to share {} on port {}: {}".format(command_args.comport,
+                                                                             command_args.share_port, e))
+            return
+        host, port = server.address
+        self.logger.info("Sharing {} on {}:{} ({})".format(command_args.comport, host, port, protocol))
+        sm_thread.set_port_share(server)
+
     def _select_filtering_file(self, command_args, remove_list=list(), add_filter=True):
         filter_files = []
         if add_filter:
@@ -550,7 +672,10 @@ class SerialMonitorCommand(sublime_plugin.ApplicationCommand):
 
         def _filter_selected(item, selected_index):
                 filter_file = filter_files[selected_index]
-                if add_filter:
+                if add_filter and filter_file.mode == FilterFile.MODE_COUNT:
+                    # Count-only filters are shown in the status bar instead of their own view
+                    sm_thread.add_filter(filter_file, None)
+                elif add_filter:
                     filter_view = self._create_new_view(sublime.active_window(), command_args.comport, filter_file.name)
                     sm_thread.add_filter(filter_file, filter_view)
                 else:
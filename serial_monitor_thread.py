@@ -1,7 +1,9 @@
 import threading
 import time
 import util
+from hardware import hardware_factory
 from filter.manager import FilterManager
+from modem_watcher import ModemLineWatcher
 import logger
 
 log = logger.get()
@@ -52,6 +54,18 @@ class SerialMonitor(threading.Thread):
     Thread that controls a stream's read, write, open, close, etc. and outputs the serial info to a sublime view
     :type stream: stream.AbstractStream
     """
+    COUNTER_STATUS_KEY = "serial_monitor_counters"
+    COUNTER_STATUS_INTERVAL = 0.5
+    LINE_ERRORS_STATUS_KEY = "serial_monitor_line_errors"
+    LINE_ERRORS_INTERVAL = 1.0
+    READ_BUFFER_SIZE = 1024
+    # Maximum number of bytes handed to the port per loop pass
+    TX_CHUNK_SIZE = 4096
+    # How often to retry opening the port while waiting for it to reconnect, in case a change was missed
+    RECONNECT_RETRY_INTERVAL = 1.0
+    # How long a new configuration waits for the data queued before it to be sent
+    RECONFIGURE_TX_TIMEOUT = 1.0
+
     def __init__(self, stream, view, window):
         super(SerialMonitor, self).__init__(name="Thread-{}".format(stream.name))
         self.stream = stream
@@ -62,20 +76,53 @@ class SerialMonitor(threading.Thread):
         self.timestamp_logging = False
         self.line_endings = "CRLF"
         self.local_echo = False
+        self.auto_reconnect = False
+        self.report_line_errors = True
+        self.modem_events = False
         self._text_to_write = []
         self._file_to_write = []
+        self._data_to_write = []
         self._text_lock = threading.Lock()
+        self._data_lock = threading.Lock()
         self._file_lock = threading.Lock()
         self._filter_manager = FilterManager()
         self._newline = True
         self._view_writer = ViewWriter(view)
+        # Held while output is filtered and queued for the view, and while a filter is added
+        self._output_lock = threading.Lock()
 
         self._new_configuration = None
+        self._reconfigure_deadline = None
+        # Reused for every read so steady-state reads don't allocate a new buffer
+        self._read_buffer = memoryview(bytearray(self.READ_BUFFER_SIZE))
+        self._counter_status = ""
+        self._counter_status_time = 0
+        self._port_share = None
+        self._port_requests = []
+        self._port_request_lock = threading.Lock()
+        # Driver error counters when the port was opened, and the last ones reported
+        self._line_errors_base = None
+        self._line_errors = None
+        self._line_errors_time = 0
+        self._modem_watcher = None
+        self._modem_events = []
+        self._modem_lock = threading.Lock()
+        # Data waiting to be sent.  The port only takes what it can send without blocking on each pass, so a
+        # device holding off the transmitter with CTS or XOFF never stops the reads
+        self._tx_buffer = bytearray()
+        self._tx_progress = False
 
     def write_line(self, text):
         with self._text_lock:
             self._text_to_write.append(text)
 
+    def write_data(self, data):
+        """
+        Queues raw bytes to be written to the port as-is, i.e. data from a port share client
+        """
+        with self._data_lock:
+            self._data_to_write.append(data)
+
     def write_file(self, view, selection):
         file_args = _WriteFileArgs(view, selection)
         with self._file_lock:
@@ -100,8 +147,19 @@ class SerialMonitor(threading.Thread):
     def set_local_echo(self, enabled):
         self.local_echo = enabled
 
+    def set_auto_reconnect(self, enabled):
+        self.auto_reconnect = enabled
+
+    def set_report_line_errors(self, enabled):
+        self.report_line_errors = enabled
+
+    def set_modem_events(self, enabled):
+        self.modem_events = enabled
+
     def add_filter(self, filtering_file, output_view):
-        self._filter_manager.add_filter(filtering_file, output_view)
+        # Back-fill the filter with the output already received on the port
+        with self._output_lock:
+            self._filter_manager.add_filter(filtering_file, output_view, self._view_writer.view)
 
     def remove_filter(self, filtering_file):
         self._filter_manager.remove_filter(filtering_file)
@@ -109,6 +167,31 @@ class SerialMonitor(threading.Thread):
     def filters(self):
         return self._filter_manager.filters()
 
+    def set_demux(self, demux):
+        self._filter_manager.set_demux(demux)
+
+    def demux(self):
+        return self._filter_manager.demux()
+
+    def set_port_share(self, server):
+        """
+        Sets the server sharing the port with other tools.  It is started once the port is open and stopped
+        when the port is closed
+
+        :type server: port_share.PortShareServer
+        """
+        self._port_share = server
+
+    def request_port_change(self, request):
+        """
+        Queues a change of the port's settings or control lines requested by a port share client.
+        It's applied by this thread so the port isn't changed while it's being read
+
+        :type request: port_share.PortRequest
+        """
+        with self._port_request_lock:
+            self._port_requests.append(request)
+
     def get_config(self):
         """
         :rtype: stream.SerialConfig
@@ -128,34 +211,129 @@ class SerialMonitor(threading.Thread):
             t = time.time()
             timestamp = time.strftime("[%m-%d-%y %H:%M:%S.", time.localtime(t)) + "%03d] " % (int(t * 1000) % 1000)
 
-        filter_thread = threading.Thread(target=self._filter_manager.apply_filters, args=(text, timestamp))
-        filter_thread.start()
-        self._view_writer.write(text, timestamp)
+        # The text is filtered and queued for the view together.  The back-fill of a new filter scans the view up
+        # to where the text filtered before the filter was added ends, so every line is written to it once
+        with self._output_lock:
+            self._filter_manager.apply_filters(text, timestamp)
+            self._view_writer.write(text, timestamp)
+
+    def _update_counter_status(self):
+        # Show the count-only filters in the status bar of the output view, at most a couple times per second
+        now = time.time()
+        if now - self._counter_status_time < self.COUNTER_STATUS_INTERVAL:
+            return
+        self._counter_status_time = now
+
+        status = self._filter_manager.counter_summary()
+        if status == self._counter_status:
+            return
+        self._counter_status = status
+        view = self._view_writer.view
+        if status:
+            util.main_thread(view.set_status, self.COUNTER_STATUS_KEY, status)
+        else:
+            util.main_thread(view.erase_status, self.COUNTER_STATUS_KEY)
+
+    def _check_line_errors(self):
+        """
+        Reports new overrun, framing, parity and break errors counted by the driver.  The increase is written to
+        the output view where it happened and the totals since the port was opened are shown in the status bar
+        """
+        now = time.time()
+        if not self.report_line_errors or now - self._line_errors_time < self.LINE_ERRORS_INTERVAL:
+            return
+        self._line_errors_time = now
+
+        counters = self.stream.error_counters()
+        if counters is None:
+            return
+        if self._line_errors_base is None:
+            # The driver's counters aren't reset when the port is opened
+            self._line_errors_base = counters
+            self._line_errors = counters
+            return
+
+        changes = ["{} +{}".format(name, count - self._line_errors[name])
+                   for name, count in sorted(counters.items()) if count > self._line_errors[name]]
+        if not changes:
+            return
+        self._line_errors = counters
+        self._write_to_output("\n[Line errors on {0}: {1}]\n".format(self.stream.comport, ", ".join(changes)))
 
-    def _read_stream(self):
-        serial_input = self.stream.read(1024)
-        if serial_input:
-            self._write_to_output(serial_input.decode(encoding="ascii", errors="replace"))
+        totals = ["{} {}".format(name, count - self._line_errors_base[name])
+                  for name, count in sorted(counters.items()) if count > self._line_errors_base[name]]
+        util.main_thread(self._view_writer.view.set_status, self.LINE_ERRORS_STATUS_KEY,
+                         "Line errors: {}".format(", ".join(totals)))
+
+    def _start_modem_watcher(self):
+        if not self.modem_events:
+            return
+        self._modem_watcher = ModemLineWatcher(self.stream, self._on_modem_change)
+        self._modem_watcher.start()
+
+    def _on_modem_change(self, change_time, lines, changed):
+        # Called from the watcher thread, the events are written from this thread so they're in line with the data
+        with self._modem_lock:
+            self._modem_events.append((change_time, lines, changed))
+
+    def _write_modem_events(self):
+        with self._modem_lock:
+            events = self._modem_events
+            self._modem_events = []
+
+        for change_time, lines, changed in events:
+            # Same format as the output timestamps, the lines are polled so the time is only known to POLL_INTERVAL
+            timestamp = time.strftime("%m-%d-%y %H:%M:%S.", time.localtime(change_time))
+            timestamp += "%03d" % (int(change_time * 1000) % 1000)
+            states = " ".join("{}={}".format(line, int(lines[line])) for line in ModemLineWatcher.LINES)
+            text = "[{0}] Modem lines on {1}: {2} (changed: {3})".format(timestamp, self.stream.comport, states,
+                                                                        ", ".join(changed))
+            log.info(text)
+            self._write_to_output("\n{}\n".format(text))
+
+    def _apply_port_requests(self):
+        with self._port_request_lock:
+            requests = self._port_requests
+            self._port_requests = []
+
+        for request in requests:
+            request.apply(self.stream.serial)
+
+    def _read_stream(self, block=True):
+        # While sending, only read what already arrived so the next chunk isn't delayed by the read timeout
+        if not block and self.stream.in_waiting() == 0:
+            return
+        num_bytes = self.stream.readinto(self._read_buffer)
+        if num_bytes:
+            if self._port_share:
+                # One copy of the chunk is shared by all clients
+                self._port_share.broadcast(bytes(self._read_buffer[:num_bytes]))
+            self._write_to_output(str(self._read_buffer[:num_bytes], encoding="ascii", errors="replace"))
 
     def _write_text(self):
         with self._text_lock:
             text_list = self._text_to_write[:]
             self._text_to_write = []
 
-        # Write any text in the queue to the serial port
-        while text_list:
-            text = text_list.pop(0)
-
+        # Queue any text to be sent to the serial port
+        for text in text_list:
             if self.local_echo:
                 self._write_to_output(text)
 
             text = util.sublime_line_endings_to_serial(text, self.line_endings)
-            self.stream.write(bytes(text, encoding="ascii"))
-            self._read_stream()
+            self._tx_buffer.extend(bytes(text, encoding="ascii"))
+
+    def _write_data(self):
+        with self._data_lock:
+            data_list = self._data_to_write
+            self._data_to_write = []
+
+        for data in data_list:
+            self._tx_buffer.extend(data)
 
     def _write_file(self):
         with self._file_lock:
-            # Write any files in the queue to the serial port
+            # Queue any files to be sent to the serial port
             while self._file_to_write:
                 output_file = self._file_to_write.pop(0)
                 for region in output_file.regions:
@@ -168,21 +346,101 @@ class SerialMonitor(threading.Thread):
                             self._write_to_output(line)
 
                         line = util.sublime_line_endings_to_serial(line, self.line_endings)
-                        self.stream.write(bytes(line, encoding="ascii"))
-                        self._read_stream()
+                        self._tx_buffer.extend(bytes(line, encoding="ascii"))
+
+    def _send(self):
+        """
+        Sends as much of the queued data as the port takes without blocking.  Ports without non-blocking
+        writes (Windows and URL ports) send the whole chunk
+        """
+        if not self._tx_buffer:
+            return
+        sent = self.stream.write(bytes(self._tx_buffer[:self.TX_CHUNK_SIZE]))
+        del self._tx_buffer[:sent]
+        # When the port took nothing the device is holding off the transmitter, the next read waits instead
+        self._tx_progress = sent > 0
+
+    def _apply_new_configuration(self):
+        """
+        Data queued before the reconfiguration is sent with the old settings first.  If the device holds off
+        the transmitter (CTS or XOFF) the new settings are applied after RECONFIGURE_TX_TIMEOUT anyway and the rest
+        of the data is sent with them, so turning off flow control unsticks the port
+        """
+        if self._tx_buffer:
+            now = time.time()
+            if self._reconfigure_deadline is None:
+                self._reconfigure_deadline = now + self.RECONFIGURE_TX_TIMEOUT
+            if now < self._reconfigure_deadline:
+                return
+            log.info("Reconfiguring {} with {} bytes not sent yet".format(self.stream.comport, len(self._tx_buffer)))
+        config = self._new_configuration
+        self._new_configuration = None
+        self._reconfigure_deadline = None
+        self.stream.reconfigure(config)
+
+    def _reconnect(self, error):
+        """
+        Waits for the device to come back after it was disconnected and reopens it with the same settings.
+        The output view, filters and logs are kept.  Returns when reconnected or the monitor is stopped
+        """
+        # Created before the port is closed so a device coming back right away isn't missed
+        watcher = hardware_factory.device_watcher()
+        try:
+            self._write_to_output("\nLost connection to {0} ({1}), waiting for it to reconnect\n".format(
+                                  self.stream.comport, error))
+            if self._modem_watcher:
+                self._modem_watcher.stop()
+            try:
+                self.stream.close()
+            except Exception as e:
+                log.debug("Error closing {}: {}".format(self.stream.comport, e))
+
+            while self.running and self.view.is_valid():
+                device = self.stream.find_device()
+                if device:
+                    try:
+                        self.stream.reopen(device)
+                        # A different device may have come back, start counting again
+                        self._line_errors_base = None
+                        self._start_modem_watcher()
+                        self._write_to_output("Reconnected to {0}\n".format(device))
+                        return
+                    except Exception as e:
+                        # The device node may exist before its permissions are set up, keep waiting
+                        log.debug("Unable to reopen {}: {}".format(device, e))
+                watcher.wait(self.RECONNECT_RETRY_INTERVAL)
+        finally:
+            watcher.close()
 
     def run(self):
         self.running = True
         try:
             self.stream.open()
+            if self._port_share:
+                self._port_share.start()
+            self._start_modem_watcher()
             while self.running and self.view.is_valid():
-                self._read_stream()
-                self._write_text()
-                self._write_file()
+                try:
+                    self._write_modem_events()
+                    self._read_stream(block=not (self._tx_buffer and self._tx_progress))
+                    self._write_text()
+                    self._write_data()
+                    self._write_file()
+                    self._send()
+                    self._apply_port_requests()
+                except OSError as e:
+                    # SerialException is an IOError, other errors are not caused by the device going away
+                    if not self.auto_reconnect:
+                        raise
+                    log.info("Lost connection to {}: {}".format(self.stream.comport, e))
+                    self._reconnect(e)
+                    continue
+                self._filter_manager.check_idle()
+                self._update_counter_status()
+                self._check_line_errors()
 
                 if self._new_configuration:
-                    self.stream.reconfigure(self._new_configuration)
-                    self._new_configuration = None
+                    self._apply_new_configuration()
         except Exception as e:
             self._write_to_output("\nError occurred on port {0}: {1}".format(self.stream.comport, str(e)))
             log.exception(e)
@@ -191,6 +449,10 @@ class SerialMonitor(threading.Thread):
             # Thread terminated, write to buffer if still valid and close the serial port
             self._write_to_output("\nDisconnected from {0}".format(self.stream.comport))
             self._filter_manager.port_closed(self.stream.comport)
+            if self._port_share:
+                self._port_share.stop()
+            if self._modem_watcher:
+                self._modem_watcher.stop()
             self.stream.close()
             self.running = False
             util.main_thread(self.window.run_command, "serial_monitor", {"serial_command": "_port_closed",
@@ -16,6 +16,22 @@ class SerialSettings(object):
         "data_bits",
         "parity",
         "stop_bits",
+        "rtscts",
+        "xonxoff",
+        "dsrdtr",
+        "use_poll",
+        "low_latency",
+        "tcp_nodelay",
+        "socket_rcvbuf",
+        "share_port",
+        "share_protocol",
+        "auto_reconnect",
+        "report_line_errors",
+        "modem_events",
+        "enable_demux",
+        "demux_pattern",
+        "demux_auto_create",
+        "demux_channels",
     ]
 
     def __init__(self, callback, **args):
@@ -31,6 +47,22 @@ class SerialSettings(object):
         self.data_bits = None
         self.parity = None
         self.stop_bits = None
+        self.rtscts = None
+        self.xonxoff = None
+        self.dsrdtr = None
+        self.use_poll = None
+        self.low_latency = None
+        self.tcp_nodelay = None
+        self.socket_rcvbuf = None
+        self.share_port = None
+        self.share_protocol = None
+        self.auto_reconnect = None
+        self.report_line_errors = None
+        self.modem_events = None
+        self.enable_demux = None
+        self.demux_pattern = None
+        self.demux_auto_create = None
+        self.demux_channels = None
 
         for attr in self.SETTINGS_LIST:
             setattr(self, attr, args.get(attr, None))
@@ -18,8 +18,29 @@ class AbstractStream(object):
     def read(self, num_bytes=1):
         raise NotImplementedError
 
+    def readinto(self, buffer):
+        raise NotImplementedError
+
+    def in_waiting(self):
+        raise NotImplementedError
+
     def write(self, data):
         raise NotImplementedError
 
     def reconfigure(self, config):
         raise NotImplementedError
+
+    def error_counters(self):
+        return None
+
+    def modem_lines(self):
+        raise NotImplementedError
+
+    def modem_change_counts(self):
+        return None
+
+    def find_device(self):
+        raise NotImplementedError
+
+    def reopen(self, device):
+        raise NotImplementedError
@@ -1,14 +1,33 @@
+import os
+import logger
 from hardware import hardware_factory
 from stream import AbstractStream, SerialSettings
 
+log = logger.get()
+
 
 class SerialTextStream(AbstractStream):
+    # Flow control settings, named the same in SerialSettings and the serial port
+    FLOW_CONTROL = ["rtscts", "xonxoff", "dsrdtr"]
+    # Driver counters of lost data and line errors
+    ERROR_COUNTERS = ["overrun", "buf_overrun", "frame", "parity", "brk"]
+    # Driver counters of the modem status line changes
+    MODEM_COUNTERS = {"CTS": "cts", "DSR": "dsr", "RI": "rng", "CD": "dcd"}
+
     def __init__(self, serial_config):
         """
         :type serial_config: SerialSettings
         """
         super(SerialTextStream, self).__init__(serial_config, serial_config.comport)
         self.comport = serial_config.comport
+        is_url = hardware_factory.is_url(self.comport)
+        # The device that is opened.  Usually the comport, but a USB device can come back under another name
+        # and URL ports get the socket options added.  The comport stays the name the port is known by
+        self.device = self.comport
+        if is_url:
+            self.device = self._add_socket_options(self.comport, serial_config)
+        self.hardware_id = None
+        self._counters_supported = True
         kwargs = {}
         if serial_config.data_bits:
             kwargs["bytesize"] = serial_config.data_bits
@@ -16,13 +35,130 @@ class SerialTextStream(AbstractStream):
             kwargs["parity"] = serial_config.parity
         if serial_config.stop_bits:
             kwargs["stopbits"] = serial_config.stop_bits
+        for flow_control in self.FLOW_CONTROL:
+            if getattr(serial_config, flow_control):
+                kwargs[flow_control] = True
         kwargs["timeout"] = 0.05
-        self.serial = hardware_factory.create_serial(None, serial_config.baud, **kwargs)
+        if not is_url and os.name == "posix":
+            # Writes don't block, the monitor sends the rest of the data on the next pass.  Only the posix port
+            # returns what the driver took, on Windows a write with a timeout of 0 is still pending when it returns
+            kwargs["writeTimeout"] = 0
+        if is_url:
+            self.serial = hardware_factory.create_serial_for_url(self.device, serial_config.baud, **kwargs)
+        else:
+            self.serial = hardware_factory.create_serial(None, serial_config.baud,
+                                                         use_poll=bool(serial_config.use_poll), **kwargs)
+
+    @staticmethod
+    def _add_socket_options(url, serial_config):
+        """
+        Adds the socket settings of the port to a socket:// or rfc2217:// URL as URL options
+
+        :type url: str
+        :type serial_config: SerialSettings
+        :return: the URL with the options appended
+        :rtype: str
+        """
+        scheme = url.split("://", 1)[0].lower()
+        options = []
+        # rfc2217 ports always disable Nagle's algorithm
+        if scheme == "socket" and serial_config.tcp_nodelay:
+            options.append("nodelay")
+        if scheme in ("socket", "rfc2217") and serial_config.socket_rcvbuf:
+            options.append("rcvbuf={}".format(int(serial_config.socket_rcvbuf)))
+        if not options:
+            return url
+        if not url.endswith("/"):
+            url += "/"
+        return url + "/".join(options)
 
     def open(self):
         if not self.serial.isOpen():
-            self.serial.port = self.comport
+            self.serial.port = self.device
             self.serial.open()
+            if self.config.low_latency:
+                self._enable_low_latency()
+            if self.hardware_id is None and not hardware_factory.is_url(self.device):
+                self.hardware_id = hardware_factory.port_hardware_id(self.device)
+
+    def _enable_low_latency(self):
+        # Only supported by some drivers (i.e. FTDI and other USB serial adapters on Linux)
+        if not hasattr(self.serial, "setLowLatencyMode"):
+            log.warning("Low latency mode is not supported for {}".format(self.device))
+            return
+        try:
+            self.serial.setLowLatencyMode(True)
+        except ValueError as e:
+            log.warning("Unable to enable low latency mode on {}: {}".format(self.device, e))
+
+    def error_counters(self):
+        """
+        Reads the driver's line error counters (Linux only): "overrun", "frame", "parity", "brk" and "buf_overrun"
+
+        :return: dict of counter name to count, or None if the port doesn't support it
+        :rtype: dict
+        """
+        counters = self._input_counters()
+        if counters is None:
+            return None
+        return {name: counters[name] for name in self.ERROR_COUNTERS}
+
+    def modem_change_counts(self):
+        """
+        Reads how often the driver saw each modem status line change (Linux only).  Catches short pulses that
+        are over before the lines are read
+
+        :return: dict of the modem status line ("CTS", "DSR", "RI", "CD") to its count,
+                 or None if the port doesn't support it
+        :rtype: dict
+        """
+        counters = self._input_counters()
+        if counters is None:
+            return None
+        return {line: counters[name] for line, name in self.MODEM_COUNTERS.items()}
+
+    def _input_counters(self):
+        if not self._counters_supported:
+            return None
+        if not hasattr(self.serial, "getInputCounters"):
+            self._counters_supported = False
+            return None
+        try:
+            return self.serial.getInputCounters()
+        except ValueError as e:
+            # i.e. USB CDC devices and ptys, don't try again
+            log.debug("Driver counters not available for {}: {}".format(self.device, e))
+            self._counters_supported = False
+            return None
+
+    def modem_lines(self):
+        """
+        :return: dict of the modem status line ("CTS", "DSR", "RI", "CD") to its state
+        :raises ValueError: if the port can't read all the lines at once
+        """
+        if not hasattr(self.serial, "getModemLines"):
+            raise ValueError("not supported by {}".format(type(self.serial).__name__))
+        return self.serial.getModemLines()
+
+    def find_device(self):
+        """
+        Looks for the device of the port after it was disconnected
+
+        :return: the device to reopen, or None if it isn't there
+        :rtype: str
+        """
+        if hardware_factory.is_url(self.comport):
+            return self.device
+        if not self.comport.startswith("/dev/") or os.path.exists(self.comport):
+            return self.comport
+        return hardware_factory.find_port_by_hardware_id(self.hardware_id)
+
+    def reopen(self, device):
+        """
+        Reopens the port with the same settings on the given device.  The port must be closed
+        """
+        self.device = device
+        self.open()
 
     def close(self):
         if self.serial.isOpen():
@@ -31,17 +167,51 @@ class SerialTextStream(AbstractStream):
     def read(self, num_bytes=1):
         return self.serial.read(num_bytes)
 
+    def in_waiting(self):
+        """
+        :return: the number of bytes that can be read without waiting, or None if the port can't tell
+        :rtype: int
+        """
+        if not hasattr(self.serial, "inWaiting"):
+            return None
+        return self.serial.inWaiting()
+
+    def readinto(self, buffer):
+        """
+        Reads directly into a caller-owned buffer
+
+        :param buffer: writable buffer to read into, i.e. a bytearray or memoryview
+        :return: the number of bytes read
+        :rtype: int
+        """
+        return self.serial.readinto(buffer)
+
     def write(self, data):
-        self.serial.write(data)
+        """
+        Writes as much of the data as the port takes without blocking.  The port may take less when the device
+        holds off the transmitter with CTS or XOFF
+
+        :return: the number of bytes written
+        :rtype: int
+        """
+        written = self.serial.write(data)
+        return len(data) if written is None else written
 
     def reconfigure(self, config):
         """
+        Applies the new settings to the open port in place, without closing it.  Data already received is kept
+        and the control lines are not toggled.  Pending output is sent with the previous settings first
+
         :type config: SerialSettings
         """
-        self.close()
-        self.serial.port = config.comport
-        self.serial.baudrate = config.baud
-        self.serial.bytesize = config.data_bits
-        self.serial.parity = config.parity
-        self.serial.stopbits = config.stop_bits
-        self.open()
+        settings = {
+            "baudrate": int(config.baud),
+            "bytesize": config.data_bits,
+            "parity": config.parity,
+            "stopbits": config.stop_bits,
+        }
+        for flow_control in self.FLOW_CONTROL:
+            if getattr(config, flow_control) is not None:
+                settings[flow_control] = bool(getattr(config, flow_control))
+        self.serial.applySettingsDict(settings)
+        self.config = config
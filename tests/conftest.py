@@ -0,0 +1,86 @@
+import os
+import sys
+import types
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(1, os.path.join(ROOT, "hardware"))
+
+
+class _Region(object):
+    def __init__(self, a, b):
+        self.a = a
+        self.b = b
+
+    def begin(self):
+        return self.a
+
+    def end(self):
+        return self.b
+
+
+def _install_sublime_stub():
+    """
+    The plugin modules import the sublime API, which only exists inside Sublime Text.
+    Provide the few functions the tested code calls.  Callbacks sent to the main thread run immediately
+    """
+    sublime = types.ModuleType("sublime")
+    sublime.Region = _Region
+    sublime.set_timeout = lambda callback, delay=0: callback()
+    sublime.status_message = lambda msg: None
+    sublime.load_settings = lambda name: {}
+    sys.modules.setdefault("sublime", sublime)
+
+
+_install_sublime_stub()
+
+
+class FakeView(object):
+    """
+    Stands in for a sublime.View, records the text written with the serial_monitor_write command
+    """
+    def __init__(self, text=""):
+        self.text = text
+        self.written = []
+        self.valid = True
+
+    def is_valid(self):
+        return self.valid
+
+    def size(self):
+        return len(self.text)
+
+    def substr(self, region):
+        return self.text[region.a:region.b]
+
+    def line(self, point):
+        return _Region(self.text.rfind("\n", 0, point) + 1, point)
+
+    def run_command(self, command, args=None):
+        if command == "serial_monitor_write":
+            self.text += args["text"]
+            self.written.append(args["text"])
+
+
+class _MainThread(object):
+    def __init__(self):
+        self.callbacks = []
+
+    def set_timeout(self, callback, delay=0):
+        self.callbacks.append(callback)
+
+    def run(self):
+        while self.callbacks:
+            self.callbacks.pop(0)()
+
+
+@pytest.fixture
+def main_thread(monkeypatch):
+    """
+    Queues the callbacks sent to the main thread, in order, until run() is called
+    """
+    queue = _MainThread()
+    monkeypatch.setattr(sys.modules["sublime"], "set_timeout", queue.set_timeout)
+    return queue
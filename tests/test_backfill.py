@@ -0,0 +1,68 @@
+import time
+
+from conftest import FakeView
+from filter.backfill import FilterBackfill, _line_time
+from filter.manager import _FilterArgs
+from filter.serial_filter import FilterFile
+
+
+def _run(source_text, extra="", chunk_size=FilterBackfill.CHUNK_SIZE):
+    filter_file = FilterFile.parse_filter_file('{"name": "f", %s "filters": [{"text": "err", "method": "contains"}]}'
+                                               % extra)
+    view = FakeView()
+    backfill = FilterBackfill(_FilterArgs(filter_file, view), FakeView(source_text))
+    backfill.CHUNK_SIZE = chunk_size
+    backfill.schedule()
+    backfill.join(5)
+    return "".join(view.written)
+
+
+def test_lines_across_chunks():
+    text = "".join("line {}{}\n".format(i, " err" if i % 3 == 0 else "") for i in range(100))
+    expected = "".join("line {} err\n".format(i) for i in range(0, 100, 3))
+    assert _run(text, chunk_size=7) == expected
+
+
+def test_last_incomplete_line_is_skipped():
+    assert _run("err 1\nerr 2") == "err 1\n"
+
+
+def test_filters_ignore_the_timestamp():
+    text = "[01-02-20 10:00:00.000] ok\n[01-02-20 10:00:01.000] err\n[01-02-20 10:00:02.000] [01-02-20 ok\n"
+    assert _run(text) == "[01-02-20 10:00:01.000] err\n"
+
+
+def test_cancel():
+    filter_file = FilterFile.parse_filter_file('{"name": "f", "filters": [{"text": "err", "method": "contains"}]}')
+    view = FakeView()
+    completed = []
+    backfill = FilterBackfill(_FilterArgs(filter_file, view), FakeView("err\n" * 10), completed.append)
+    backfill.cancel()
+    backfill.schedule()
+    backfill.join(5)
+    assert view.written == []
+    assert completed == [backfill]
+
+
+def test_context():
+    assert _run("a\nb\nerr\nc\nd\n", '"before": 1, "after": 1,') == "b\nerr\nc\n"
+
+
+def test_line_time():
+    expected = time.mktime(time.strptime("01-02-20 10:00:01", "%m-%d-%y %H:%M:%S")) + 0.25
+    assert _line_time("[01-02-20 10:00:01.250] text\n") == expected
+    assert _line_time("text\n") is None
+
+
+def test_record_idle_gap_uses_line_times():
+    text = ("[01-02-20 10:00:00.000] err\n"
+            "[01-02-20 10:00:00.100] a\n"
+            "[01-02-20 10:00:05.000] ok\n"
+            "[01-02-20 10:00:05.100] b\n")
+    output = _run(text, '"record": {"idle_gap": 1},')
+    assert output == "[01-02-20 10:00:00.000] err\n[01-02-20 10:00:00.100] a\n"
+
+
+def test_records_without_times():
+    output = _run("BEGIN\nerr\nEND\nBEGIN\nok\nEND\nBEGIN\nerr", '"record": {"start": "^BEGIN", "idle_gap": 1},')
+    assert output == "BEGIN\nerr\nEND\n"
@@ -0,0 +1,40 @@
+from collections import deque
+
+from filter.context import FilterContext
+
+
+def _run(context, lines, matches):
+    history = deque(maxlen=context.before)
+    output = []
+    for i, line in enumerate(lines):
+        output.extend(context.select(i, line, line in matches, history))
+        history.append((i, line))
+    return output
+
+
+def test_no_context_writes_only_matches():
+    assert _run(FilterContext(), ["a", "b", "c"], {"b"}) == ["b"]
+
+
+def test_before_and_after():
+    lines = ["1", "2", "x", "3", "4", "5"]
+    assert _run(FilterContext(before=1, after=2), lines, {"x"}) == ["2", "x", "3", "4"]
+
+
+def test_overlapping_context_is_written_once():
+    lines = ["1", "x", "2", "y", "3"]
+    assert _run(FilterContext(before=1, after=1), lines, {"x", "y"}) == ["1", "x", "2", "y", "3"]
+
+
+def test_separator_between_groups():
+    lines = ["x", "1", "2", "3", "y"]
+    assert _run(FilterContext(after=1), lines, {"x", "y"}) == ["x", "1", FilterContext.SEPARATOR, "y"]
+
+
+def test_no_separator_for_adjacent_groups():
+    lines = ["x", "1", "y"]
+    assert _run(FilterContext(after=1), lines, {"x", "y"}) == ["x", "1", "y"]
+
+
+def test_before_is_limited_to_history():
+    assert _run(FilterContext(before=5), ["1", "x"], {"x"}) == ["1", "x"]
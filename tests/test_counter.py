@@ -0,0 +1,38 @@
+import pytest
+
+from filter.counter import FilterCounter
+from filter.serial_filter import FilterFile
+
+
+def _filter_file(exclude=False):
+    return FilterFile.parse_filter_file('{"name": "f", "exclude": %s, "filters": '
+                                        '[{"text": "err", "method": "contains"}, {"text": "warn", "method": "contains"}]}'
+                                        % ("true" if exclude else "false"))
+
+
+def test_counts_each_pattern():
+    counter = FilterCounter(_filter_file(), window=10)
+    for line in ["err 1", "warn 1", "err warn", "ok"]:
+        counter.count(line, 100.0)
+    assert counter.summary(100.0) == "f: 'err': 2 (0.2/s), 'warn': 2 (0.2/s)"
+
+
+def test_rate_window_expires():
+    counter = FilterCounter(_filter_file(), window=2)
+    counter.count("err", 100.0)
+    counter.count("err", 101.0)
+    assert counter.summary(101.0) == "f: 'err': 2 (1.0/s), 'warn': 0 (0.0/s)"
+    assert counter.summary(102.0) == "f: 'err': 2 (0.5/s), 'warn': 0 (0.0/s)"
+    assert counter.summary(110.0) == "f: 'err': 2 (0.0/s), 'warn': 0 (0.0/s)"
+
+
+@pytest.mark.parametrize("lines,expected", [
+    (["err", "warn", "ok", "fine"], 2),
+    (["err", "warn"], 0),
+])
+def test_exclude_counts_the_lines_shown(lines, expected):
+    counter = FilterCounter(_filter_file(exclude=True), window=10)
+    for line in lines:
+        counter.count(line, 100.0)
+    assert counter.summary(100.0) == "f: '{}': {} ({:.1f}/s)".format(FilterCounter.EXCLUDE_LABEL, expected,
+                                                                    expected / 10.0)
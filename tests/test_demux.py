@@ -0,0 +1,88 @@
+import re
+
+import pytest
+
+from conftest import FakeView
+from filter.demux import ChannelDemux
+
+
+class _Views(object):
+    def __init__(self):
+        self.views = {}
+
+    def __call__(self, name):
+        self.views[name] = FakeView()
+        return self.views[name]
+
+    def written(self, name):
+        return "".join(self.views[name].written)
+
+
+@pytest.mark.parametrize("line,tag", [
+    ("[BLE] connected", "BLE"),
+    ("[wifi-2] up", "wifi-2"),
+    ("BLE connected", None),
+    ("[    1.234] kernel", None),
+    ("[12:00:00] time", None),
+    ("[" + "x" * 40 + "] long", None),
+])
+def test_default_tag(line, tag):
+    assert ChannelDemux(None).extract_tag(line) == tag
+
+
+def test_pattern_tag():
+    demux = ChannelDemux(None, pattern=r"^<(\w+)>")
+    assert demux.extract_tag("<wifi> up") == "wifi"
+    assert demux.extract_tag("[wifi] up") is None
+
+
+@pytest.mark.parametrize("pattern,error", [(r"^<\w+>", ValueError), (r"^<(\w+", re.error)])
+def test_bad_pattern(pattern, error):
+    with pytest.raises(error):
+        ChannelDemux(None, pattern=pattern)
+
+
+def test_route_creates_channels():
+    views = _Views()
+    demux = ChannelDemux(views)
+    demux.route([("[a] 1\n", "t [a] 1\n"), ("[b] 2\n", "[b] 2\n"), ("none\n", "none\n"), ("[a] 3\n", "[a] 3\n")])
+    assert demux.channels() == ["a", "b"]
+    assert views.written("a") == "t [a] 1\n[a] 3\n"
+    assert views.written("b") == "[b] 2\n"
+
+
+def test_route_without_auto_create():
+    views = _Views()
+    demux = ChannelDemux(views, auto_create=False, channels=["a"])
+    demux.route([("[a] 1\n", "[a] 1\n"), ("[b] 2\n", "[b] 2\n")])
+    assert demux.channels() == ["a"]
+    assert views.written("a") == "[a] 1\n"
+
+
+def test_auto_created_channels_are_capped():
+    views = _Views()
+    demux = ChannelDemux(views, channels=["given"])
+    lines = [("[c{}] x\n".format(i), "[c{}] x\n".format(i)) for i in range(ChannelDemux.MAX_AUTO_CHANNELS + 5)]
+    demux.route(lines + [("[given] y\n", "[given] y\n"), ("[c0] z\n", "[c0] z\n")])
+    assert len(views.views) == ChannelDemux.MAX_AUTO_CHANNELS + 1
+    assert "c{}".format(ChannelDemux.MAX_AUTO_CHANNELS) not in demux.channels()
+    assert views.written("given") == "[given] y\n"
+    assert views.written("c0") == "[c0] x\n[c0] z\n"
+
+
+def test_text_before_the_view_exists_is_kept(main_thread):
+    views = _Views()
+    demux = ChannelDemux(views)
+    demux.route([("[a] 1\n", "[a] 1\n")])
+    demux.route([("[a] 2\n", "[a] 2\n")])
+    main_thread.run()
+    assert views.written("a") == "[a] 1\n[a] 2\n"
+
+
+def test_write_all_skips_closed_views():
+    views = _Views()
+    demux = ChannelDemux(views, channels=["a", "b"])
+    views.views["b"].valid = False
+    demux.write_all("sep\n")
+    assert views.written("a") == "sep\n"
+    assert views.written("b") == ""
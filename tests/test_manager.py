@@ -0,0 +1,122 @@
+from conftest import FakeView
+from filter.demux import ChannelDemux
+from filter.manager import FilterManager
+from filter.serial_filter import FilterFile
+
+
+def _filter_file(extra=""):
+    return FilterFile.parse_filter_file('{"name": "f", %s "filters": [{"text": "err", "method": "contains"}]}' % extra)
+
+
+def _backfill(manager):
+    backfill = manager._filters[0].backfill
+    if backfill:
+        backfill.join(5)
+
+
+def test_lines_split_across_writes():
+    view = FakeView()
+    manager = FilterManager()
+    manager.add_filter(_filter_file(), view)
+    manager.apply_filters("ok\ner", "[t] ")
+    manager.apply_filters("r 1\nerr 2\nok\n", "[t] ")
+    assert "".join(view.written) == "[t] err 1\n[t] err 2\n"
+
+
+def test_closed_views_are_removed():
+    view = FakeView()
+    manager = FilterManager()
+    manager.add_filter(_filter_file(), view)
+    view.valid = False
+    manager.apply_filters("err\n")
+    assert view.written == []
+    assert manager.filters() == []
+
+
+def test_backfill_is_written_before_live_text():
+    source = FakeView("err 1\nok\nerr 2\npartial err")
+    view = FakeView()
+    manager = FilterManager()
+    # The manager sees the live text before the filter is added, the back-fill skips the incomplete line
+    manager.apply_filters("err 2\npartial err")
+    manager.add_filter(_filter_file(), view, source)
+    _backfill(manager)
+    manager.apply_filters(" 3\n")
+    assert "".join(view.written) == "err 1\nerr 2\npartial err 3\n"
+
+
+def test_backfill_cut_over(main_thread):
+    source = FakeView()
+    view = FakeView()
+    manager = FilterManager()
+
+    def output(text):
+        # Same as SerialMonitor: filtered, then queued for the output view
+        manager.apply_filters(text)
+        main_thread.set_timeout(lambda: source.run_command("serial_monitor_write", {"text": text}))
+
+    output("err 1\n")
+    main_thread.run()
+    # Filtered before the filter is added, but not in the view yet
+    output("err 2\npart")
+    manager.add_filter(_filter_file(), view, source)
+    output("ial err 3\nerr 4\n")
+    main_thread.run()
+    _backfill(manager)
+    main_thread.run()
+    assert "".join(view.written) == "err 1\nerr 2\npartial err 3\nerr 4\n"
+
+
+def test_context_across_writes():
+    view = FakeView()
+    manager = FilterManager()
+    manager.add_filter(_filter_file('"before": 1,'), view)
+    manager.apply_filters("a\nb\n")
+    manager.apply_filters("err\n")
+    assert "".join(view.written) == "b\nerr\n"
+
+
+def test_records():
+    view = FakeView()
+    manager = FilterManager()
+    manager.add_filter(_filter_file('"record": {"start": "^BEGIN", "end": "^END"},'), view)
+    manager.apply_filters("BEGIN\nerr\nEND\nBEGIN\nok\nEND\n")
+    assert "".join(view.written) == "BEGIN\nerr\nEND\n"
+
+
+def test_record_idle_gap(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("filter.manager.time.time", lambda: now[0])
+    view = FakeView()
+    manager = FilterManager()
+    manager.add_filter(_filter_file('"record": {"idle_gap": 0.5},'), view)
+    manager.apply_filters("err\nmore\n")
+    manager.check_idle()
+    assert view.written == []
+    now[0] += 1
+    manager.check_idle()
+    assert "".join(view.written) == "err\nmore\n"
+
+
+def test_demux():
+    manager = FilterManager()
+    views = {}
+    manager.set_demux(ChannelDemux(lambda name: views.setdefault(name, FakeView())))
+    manager.apply_filters("[a] err\n[b] o", "[t] ")
+    manager.apply_filters("k\n", "[t] ")
+    assert "".join(views["a"].written) == "[t] [a] err\n"
+    assert "".join(views["b"].written) == "[t] [b] ok\n"
+    manager.port_closed("p")
+    assert views["a"].written[-1] == "Disconnected from p"
+
+
+def test_counters(monkeypatch):
+    monkeypatch.setattr("filter.manager.time.time", lambda: 100.0)
+    manager = FilterManager()
+    manager.add_filter(_filter_file('"mode": "count",'), None)
+    manager.apply_filters("err 1\nok\ner")
+    manager.apply_filters("r 2\n")
+    assert manager.counter_summary() == "f: 'err': 2 (0.2/s)"
+    assert [f.name for f in manager.filters()] == ["f"]
+    manager.remove_filter(manager.filters()[0])
+    assert manager.counter_summary() == ""
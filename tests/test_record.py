@@ -0,0 +1,43 @@
+from filter.record import RecordRule, RecordAssembler
+
+
+def _add(assembler, lines, times=None):
+    records = []
+    for i, line in enumerate(lines):
+        records.extend(assembler.add_line(line, "> " + line, times[i] if times else None))
+    return records
+
+
+def test_start_and_end():
+    assembler = RecordAssembler(RecordRule(start="^BEGIN", end="^END"))
+    records = _add(assembler, ["x\n", "BEGIN\n", "a\n", "END\n", "y\n"])
+    assert records == [("x\n", "> x\n"), ("BEGIN\na\nEND\n", "> BEGIN\n> a\n> END\n"), ("y\n", "> y\n")]
+
+
+def test_start_completes_the_previous_record():
+    assembler = RecordAssembler(RecordRule(start="^BEGIN"))
+    records = _add(assembler, ["BEGIN 1\n", "a\n", "BEGIN 2\n"])
+    assert records == [("BEGIN 1\na\n", "> BEGIN 1\n> a\n")]
+    assert assembler.flush() == ("BEGIN 2\n", "> BEGIN 2\n")
+    assert assembler.flush() is None
+
+
+def test_max_lines():
+    assembler = RecordAssembler(RecordRule(end="^END", max_lines=2))
+    records = _add(assembler, ["a\n", "b\n", "c\n"])
+    assert [r[0] for r in records] == ["a\nb\n"]
+
+
+def test_idle_gap():
+    assembler = RecordAssembler(RecordRule(idle_gap=1.0))
+    records = _add(assembler, ["a\n", "b\n", "c\n"], [10.0, 10.5, 12.0])
+    assert [r[0] for r in records] == ["a\nb\n"]
+    assert assembler.flush_idle(12.5) is None
+    assert assembler.flush_idle(13.0) == ("c\n", "> c\n")
+
+
+def test_idle_gap_is_ignored_without_times():
+    assembler = RecordAssembler(RecordRule(idle_gap=1.0))
+    assert _add(assembler, ["a\n", "b\n"]) == []
+    assert assembler.flush_idle(100.0) is None
+    assert assembler.flush() == ("a\nb\n", "> a\n> b\n")
@@ -0,0 +1,219 @@
+import socket
+import struct
+import threading
+import time
+
+import pytest
+
+import serial
+from serial import rfc2217
+from serial.serialutil import SerialException
+
+
+class _Server(threading.Thread):
+    """
+    Minimal RFC 2217 server for a loop:// port, along the lines of the pyserial example server.
+    Data written by the client is looped back to it
+    """
+    def __init__(self):
+        super(_Server, self).__init__()
+        self.daemon = True
+        self.port = serial.serial_for_url("loop://", timeout=0.05)
+        self.listener = socket.socket()
+        self.listener.bind(("127.0.0.1", 0))
+        self.listener.listen(1)
+        self.connection = None
+        self.manager = None
+        self._write_lock = threading.Lock()
+        self.running = True
+
+    def write(self, data):
+        # Used by the PortManager for the Telnet answers, and for the data read from the port
+        with self._write_lock:
+            self.connection.sendall(data)
+
+    def run(self):
+        self.connection, _ = self.listener.accept()
+        self.manager = rfc2217.PortManager(self.port, self)
+        reader = threading.Thread(target=self._port_to_socket)
+        reader.daemon = True
+        reader.start()
+        try:
+            while self.running:
+                data = self.connection.recv(4096)
+                if not data:
+                    break
+                data = self.manager.filter(data)
+                if data:
+                    self.port.write(data)
+        except socket.error:
+            pass
+
+    def _port_to_socket(self):
+        while self.running:
+            data = self.port.read(4096)
+            if data:
+                try:
+                    self.write(self.manager.escape(data))
+                except socket.error:
+                    return
+
+    def disconnect(self):
+        self.running = False
+        self.connection.shutdown(socket.SHUT_RDWR)
+        self.connection.close()
+
+    def url(self):
+        return "rfc2217://127.0.0.1:{}".format(self.listener.getsockname()[1])
+
+
+@pytest.fixture
+def server():
+    server = _Server()
+    server.start()
+    yield server
+    server.running = False
+    server.listener.close()
+    server.port.close()
+
+
+@pytest.fixture
+def client(server):
+    port = serial.serial_for_url(server.url(), timeout=1)
+    yield port
+    port.close()
+
+
+def _wait_for(predicate, timeout=2):
+    deadline = time.time() + timeout
+    while not predicate() and time.time() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_bulk_data_with_iac(server, client):
+    data = bytes(range(256)) * 4096
+    server.port.write(data)
+    client.timeout = 5
+    assert client.read(len(data)) == data
+    assert client.inWaiting() == 0
+
+
+def test_read_timeout_returns_what_was_received(server, client):
+    client.timeout = 0.1
+    server.port.write(b"abc")
+    assert client.read(10) == b"abc"
+    assert client.read(1) == b""
+
+
+def test_small_reads_compact_the_buffer(server, client):
+    client.READ_COMPACT_SIZE = 1024
+    data = bytes(range(256)) * 64
+    server.port.write(data)
+    assert _wait_for(lambda: client.inWaiting() == len(data))
+    received = b"".join(client.read(100) for _ in range(len(data) // 100 + 1))
+    assert received == data
+    assert client._read_offset == 0
+    assert len(client._read_buffer) == 0
+
+
+def test_flush_input(server, client):
+    server.port.write(b"old data")
+    assert _wait_for(lambda: client.inWaiting() == 8)
+    client.flushInput()
+    assert client.inWaiting() == 0
+    client.write(b"new")
+    assert client.read(3) == b"new"
+
+
+def test_received_data_is_read_before_the_error(server, client):
+    server.port.write(b"last")
+    assert _wait_for(lambda: client.inWaiting() == 4)
+    server.disconnect()
+    assert _wait_for(lambda: client._thread is None)
+    assert client.read(10) == b"last"
+    with pytest.raises(SerialException):
+        client.read(1)
+
+
+class _Connection(object):
+    def __init__(self):
+        self.written = []
+
+    def write(self, data):
+        self.written.append(data)
+
+
+@pytest.fixture
+def manager():
+    port = serial.serial_for_url("loop://", timeout=0)
+    manager = rfc2217.PortManager(port, _Connection())
+    # Drop the initial option requests
+    manager.connection.written = []
+    yield manager
+    port.close()
+
+
+def test_filter_passes_plain_data_through(manager):
+    data = b"plain data" * 100
+    assert manager.filter(data) is data
+    assert manager.connection.written == []
+
+
+def test_filter_unescapes_iac(manager):
+    assert manager.filter(b"a" + rfc2217.IAC_DOUBLED + b"b") == b"a\xffb"
+    # The escaped IAC is split between two reads
+    assert manager.filter(b"c" + rfc2217.IAC) == b"c"
+    assert manager.filter(rfc2217.IAC + b"d") == b"\xffd"
+
+
+def test_filter_answers_options_in_the_data(manager):
+    data = b"ab" + rfc2217.IAC + rfc2217.DO + rfc2217.BINARY + b"cd"
+    assert manager.filter(data) == b"abcd"
+    assert manager.connection.written == [rfc2217.IAC + rfc2217.WILL + rfc2217.BINARY]
+
+
+def test_filter_sets_the_baudrate(manager):
+    suboption = rfc2217.COM_PORT_OPTION + rfc2217.SET_BAUDRATE + struct.pack("!I", 57600)
+    data = b"x" + rfc2217.IAC + rfc2217.SB + suboption + rfc2217.IAC + rfc2217.SE + b"y"
+    # The subnegotiation arrives in pieces
+    assert manager.filter(data[:5]) == b"x"
+    assert manager.filter(data[5:]) == b"y"
+    assert manager.serial.baudrate == 57600
+    assert len(manager.connection.written) == 1
+    assert struct.pack("!I", 57600) in manager.connection.written[0]
+
+
+def test_escape(manager):
+    data = b"no iac"
+    assert manager.escape(data) is data
+    assert manager.escape(b"a\xffb\xff") == b"a\xff\xffb\xff\xff"
+    assert manager.filter(manager.escape(bytes(range(256)))) == bytes(range(256))
+
+
+def test_open_does_not_wait_for_the_timeout(server):
+    start = time.time()
+    port = serial.serial_for_url(server.url(), timeout=1)
+    try:
+        # The client is woken by the answers instead of polling them until the network timeout
+        assert time.time() - start < 1
+        assert port.isOpen()
+    finally:
+        port.close()
+
+
+def test_baudrate_is_set_on_the_server(server, client):
+    start = time.time()
+    client.baudrate = 57600
+    assert time.time() - start < 1
+    assert server.port.baudrate == 57600
+
+
+def test_readline(server, client):
+    server.port.write(b"one\ntwo\nthr")
+    assert client.readline() == b"one\n"
+    # The rest of the chunk is put back into the read buffer
+    assert _wait_for(lambda: client.inWaiting() == len(b"two\nthr"))
+    assert client.readline() == b"two\n"
+    server.port.write(b"ee\n")
+    assert client.readline() == b"three\n"
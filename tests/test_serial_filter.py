@@ -0,0 +1,84 @@
+import pytest
+
+from filter.record import RecordRule
+from filter.serial_filter import FilterFile, FilterAttributeError, FilterParsingError
+
+
+def _parse(text):
+    return FilterFile.parse_filter_file(text)
+
+
+def test_parse_defaults():
+    f = _parse('{"name": "f", "filters": [{"text": "err", "method": "contains"}]}')
+    assert f.name == "f"
+    assert not f.exclude
+    assert (f.before, f.after, f.record, f.mode) == (0, 0, None, FilterFile.MODE_VIEW)
+
+
+def test_parse_allows_comments():
+    f = _parse('{\n// comment\n/* block\n comment */\n"name": "f", "filters": [{"text": "a", "method": "exact"}]}')
+    assert f.check_filters("a")
+
+
+def test_parse_context():
+    f = _parse('{"name": "f", "before": 2, "after": 3, "filters": [{"text": "a", "method": "contains"}]}')
+    assert (f.before, f.after) == (2, 3)
+
+
+def test_parse_bad_values_fall_back_to_defaults():
+    f = _parse('{"name": "f", "before": -1, "after": true, "exclude": "yes",'
+               ' "filters": [{"text": "a", "method": "contains"}]}')
+    assert (f.before, f.after, f.exclude) == (0, 0, False)
+
+
+def test_parse_mode():
+    f = _parse('{"name": "f", "mode": "count", "filters": [{"text": "a", "method": "contains"}]}')
+    assert f.mode == FilterFile.MODE_COUNT
+    f = _parse('{"name": "f", "mode": "graph", "filters": [{"text": "a", "method": "contains"}]}')
+    assert f.mode == FilterFile.MODE_VIEW
+
+
+def test_parse_missing_required_fields():
+    assert _parse('{"name": "f"}') is None
+    with pytest.raises(FilterAttributeError):
+        _parse('{"name": "f", "filters": [{"text": "a"}]}')
+    with pytest.raises(FilterParsingError):
+        _parse('{"name": ')
+
+
+def test_parse_record():
+    f = _parse('{"name": "f", "record": {"start": "^CRASH", "idle_gap": 0.5},'
+               ' "filters": [{"text": "a", "method": "contains"}]}')
+    assert isinstance(f.record, RecordRule)
+    assert f.record.start.pattern == "^CRASH"
+    assert f.record.idle_gap == 0.5
+    assert f.record.max_lines == RecordRule.DEFAULT_MAX_LINES
+
+
+@pytest.mark.parametrize("record", ['{}', '"x"', '{"idle_gap": -1}', '{"start": "("}'])
+def test_parse_bad_record(record):
+    with pytest.raises(FilterAttributeError):
+        _parse('{"name": "f", "record": %s, "filters": [{"text": "a", "method": "contains"}]}' % record)
+
+
+@pytest.mark.parametrize("method,text,line,case_sensitive,expected", [
+    ("contains", "err", "an ERROR\n", False, True),
+    ("contains", "err", "an ERROR\n", True, False),
+    ("startswith", "boot", "Boot ok\n", False, True),
+    ("endswith", "ok", "boot ok", False, True),
+    ("exact", "ok", "OK", False, True),
+    ("regex", r"t\d+", "t42\n", False, True),
+    ("regex", r"^t\d+$", "x t42", False, False),
+])
+def test_filter_methods(method, text, line, case_sensitive, expected):
+    f = _parse('{"name": "f", "filters": [{"text": "%s", "method": "%s", "case_sensitive": %s}]}' %
+               (text.replace("\\", "\\\\"), method, "true" if case_sensitive else "false"))
+    assert f.check_filters(line) is expected
+
+
+def test_exclude_inverts_the_match():
+    f = _parse('{"name": "f", "exclude": true, "filters": [{"text": "a", "method": "contains"},'
+               ' {"text": "b", "method": "contains"}]}')
+    assert not f.check_filters("a\n")
+    assert not f.check_filters("b\n")
+    assert f.check_filters("c\n")
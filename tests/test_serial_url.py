@@ -0,0 +1,134 @@
+import socket
+import threading
+import time
+
+import pytest
+
+import serial
+from serial.serialutil import SerialException
+
+
+@pytest.fixture
+def socket_port():
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(1)
+    port = serial.serial_for_url("socket://127.0.0.1:{}".format(server.getsockname()[1]), timeout=1)
+    connection, _ = server.accept()
+    server.close()
+    yield port, connection
+    port.close()
+    connection.close()
+
+
+def test_socket_buffered_read(socket_port):
+    port, connection = socket_port
+    connection.sendall(b"0123456789")
+    assert port.read(3) == b"012"
+    # The rest was received with the first read and is served from the buffer
+    assert port.inWaiting() == 7
+    assert port.read(7) == b"3456789"
+    assert port.inWaiting() == 0
+
+
+def test_socket_read_timeout(socket_port):
+    port, connection = socket_port
+    port.timeout = 0.1
+    connection.sendall(b"abc")
+    assert port.read(10) == b"abc"
+    assert port.read(1) == b""
+
+
+def test_socket_eof_raises_after_buffered_data(socket_port):
+    port, connection = socket_port
+    connection.sendall(b"last")
+    connection.shutdown(socket.SHUT_WR)
+    assert port.read(4) == b"last"
+    with pytest.raises(SerialException):
+        port.read(1)
+
+
+def _later(delay, function, *args):
+    timer = threading.Timer(delay, function, args)
+    timer.start()
+    return timer
+
+
+def test_loop_read_wakes_on_write():
+    port = serial.serial_for_url("loop://", timeout=5)
+    try:
+        _later(0.1, port.write, b"data")
+        start = time.time()
+        assert port.read(4) == b"data"
+        assert time.time() - start < 1
+    finally:
+        port.close()
+
+
+def test_loop_read_timeout_returns_partial_data():
+    port = serial.serial_for_url("loop://", timeout=0.1)
+    try:
+        port.write(b"ab")
+        assert port.read(4) == b"ab"
+        assert port.read(1) == b""
+    finally:
+        port.close()
+
+
+def test_loop_close_wakes_the_reader():
+    port = serial.serial_for_url("loop://", timeout=None)
+    result = []
+    reader = threading.Thread(target=lambda: result.append(port.read(1)))
+    reader.start()
+    time.sleep(0.05)
+    port.close()
+    reader.join(1)
+    assert not reader.is_alive()
+    assert result == [b""]
+
+
+def test_loop_readline():
+    port = serial.serial_for_url("loop://", timeout=0.1)
+    try:
+        port.write(b"first\nsecond\r\nthi")
+        assert port.readline() == b"first\n"
+        assert port.readline() == b"second\r\n"
+        # A partial line is returned once the timeout expires
+        assert port.readline() == b"thi"
+        port.write(b"rd\n")
+        assert port.readline() == b"rd\n"
+    finally:
+        port.close()
+
+
+def test_loop_readline_size_and_eol():
+    port = serial.serial_for_url("loop://", timeout=0.1)
+    try:
+        port.write(b"abcdef\r\nxyz")
+        assert port.readline(4) == b"abcd"
+        assert port.readline(eol=b"\r\n") == b"ef\r\n"
+        assert port.read(3) == b"xyz"
+    finally:
+        port.close()
+
+
+def test_loop_readline_long_line():
+    port = serial.serial_for_url("loop://", timeout=0.1)
+    try:
+        line = b"x" * (port.READLINE_CHUNK_SIZE * 3 + 5) + b"\n"
+        port.write(line + line)
+        assert port.readline() == line
+        assert port.readline() == line
+        assert port.inWaiting() == 0
+    finally:
+        port.close()
+
+
+def test_socket_readline(socket_port):
+    port, connection = socket_port
+    connection.sendall(b"one\ntwo\nthree")
+    assert port.readline() == b"one\n"
+    assert port.inWaiting() == len(b"two\nthree")
+    assert port.readline() == b"two\n"
+    connection.sendall(b"\n")
+    assert port.readline() == b"three\n"
@@ -0,0 +1,78 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+import serial_utils
+
+
+def _add_tty(root, name, device=True, port_type=None):
+    tty = root.mkdir(name)
+    if device:
+        tty.mkdir("device")
+    if port_type is not None:
+        tty.join("type").write(port_type)
+
+
+@pytest.fixture
+def sysfs(tmpdir, monkeypatch):
+    monkeypatch.setattr(serial_utils, "SYSFS_TTY", str(tmpdir))
+    monkeypatch.setattr(serial_utils.os, "access", lambda path, mode: True)
+    _add_tty(tmpdir, "ttyUSB0")
+    _add_tty(tmpdir, "ttyS0", port_type="4")
+    _add_tty(tmpdir, "ttyS1", port_type="0")
+    _add_tty(tmpdir, "ttyS2")
+    _add_tty(tmpdir, "tty1", device=False)
+    return tmpdir
+
+
+def test_sysfs_ports(sysfs):
+    ports, ambiguous = serial_utils._sysfs_ports()
+    assert sorted(ports) == ["/dev/ttyS0", "/dev/ttyUSB0"]
+    assert ambiguous == ["/dev/ttyS2"]
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="sysfs is only used on Linux")
+def test_list_ports_only_probes_ambiguous_ports(sysfs, monkeypatch):
+    probed = []
+    monkeypatch.setattr(serial_utils, "_probe", lambda port: probed.append(port) or True)
+    assert serial_utils.list_ports(exclude=["/dev/ttyUSB0"]) == ["/dev/ttyS0", "/dev/ttyS2"]
+    assert probed == ["/dev/ttyS2"]
+
+
+def test_probe_ports_skips_hanging_ports(monkeypatch):
+    release = threading.Event()
+
+    def probe(port):
+        if port == "/dev/ttyS1":
+            release.wait(5)
+        return True
+
+    monkeypatch.setattr(serial_utils, "_probe", probe)
+    try:
+        assert serial_utils._probe_ports(["/dev/ttyS0", "/dev/ttyS1"], timeout=0.1) == ["/dev/ttyS0"]
+    finally:
+        release.set()
+
+
+def test_device_watcher_without_path_sleeps():
+    watcher = serial_utils.device_watcher(None)
+    start = time.time()
+    assert watcher.wait(0.05)
+    assert time.time() - start >= 0.04
+    assert watcher.changed()
+
+
+def test_device_watcher_sees_new_devices(tmpdir):
+    watcher = serial_utils.device_watcher(str(tmpdir))
+    if watcher.fd is None:
+        pytest.skip("inotify is not available")
+    try:
+        assert not watcher.wait(0.01)
+        tmpdir.join("ttyUSB0").write("")
+        assert watcher.wait(1)
+        assert not watcher.changed()
+    finally:
+        os.close(watcher.fd)
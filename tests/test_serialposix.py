@@ -0,0 +1,150 @@
+import array
+import os
+import select
+import time
+
+import pytest
+
+import serial
+from serial.serialutil import SerialException
+
+pytestmark = pytest.mark.skipif(os.name != "posix" or not hasattr(os, "openpty"), reason="needs a pty")
+
+
+@pytest.fixture(params=["Serial", "PosixPollSerial"])
+def pty(request):
+    """
+    Yields a port opened on the slave side of a pty and the file descriptor of the master side
+    """
+    master, slave = os.openpty()
+    port = getattr(serial, request.param)(os.ttyname(slave), timeout=0.5)
+    os.close(slave)
+    yield port, master
+    port.close()
+    os.close(master)
+
+
+def test_readinto(pty):
+    port, master = pty
+    port.timeout = 0.05
+    os.write(master, b"hello world")
+    buf = bytearray(5)
+    assert port.readinto(buf) == 5
+    assert buf == b"hello"
+    view = memoryview(bytearray(16))
+    n = port.readinto(view[2:])
+    assert view[2:2 + n].tobytes() == b" world"
+
+
+def test_readinto_timeout(pty):
+    port, master = pty
+    port.timeout = 0.05
+    os.write(master, b"abc")
+    buf = bytearray(10)
+    assert port.readinto(buf) == 3
+    assert port.readinto(buf) == 0
+
+
+def test_readinto_other_buffer_types(pty):
+    port, master = pty
+    os.write(master, b"\x01\x00\x02\x00")
+    buf = array.array("H", [0, 0])
+    assert port.readinto(buf) == 4
+    assert buf.tolist() == [1, 2]
+
+
+def test_read_after_unread(pty):
+    port, master = pty
+    os.write(master, b"cd")
+    port._unread(b"ab")
+    assert port.inWaiting() == 4
+    assert port.read(3) == b"abc"
+    assert port.read(1) == b"d"
+
+
+def test_read_buffer_is_not_shared(pty):
+    port, master = pty
+    os.write(master, b"first")
+    first = port.read(5)
+    os.write(master, b"other")
+    assert port.read(5) == b"other"
+    assert first == b"first"
+
+
+def test_port_is_selectable(pty):
+    port, master = pty
+    assert select.select([port], [], [], 0)[0] == []
+    os.write(master, b"x")
+    assert select.select([port], [], [], 0.5)[0] == [port]
+    assert port.read(1) == b"x"
+
+
+@pytest.mark.parametrize("cls", ["Serial", "PosixPollSerial"])
+def test_hangup_raises(cls):
+    master, slave = os.openpty()
+    port = getattr(serial, cls)(os.ttyname(slave), timeout=0.05)
+    os.close(slave)
+    try:
+        os.write(master, b"last")
+        assert port.read(4) == b"last"
+        os.close(master)
+        with pytest.raises(SerialException):
+            port.read(1)
+    finally:
+        port.close()
+
+
+def test_poll_object_is_reused():
+    master, slave = os.openpty()
+    port = serial.PosixPollSerial(os.ttyname(slave), timeout=0.05)
+    os.close(slave)
+    try:
+        poll = port._poll
+        os.write(master, b"ab")
+        assert port.read(1) == b"a"
+        assert port.read(1) == b"b"
+        assert port._poll is poll
+    finally:
+        port.close()
+        os.close(master)
+    assert port._poll is None
+
+
+def test_reconfigure_in_place(pty):
+    port, master = pty
+    fd = port.fd
+    os.write(master, b"received")
+    port.applySettingsDict({"baudrate": 57600, "parity": serial.PARITY_EVEN})
+    assert port.fd == fd
+    assert port.baudrate == 57600
+    assert port.parity == serial.PARITY_EVEN
+    assert port.read(8) == b"received"
+
+
+def test_reconfigure_invalid_value_changes_nothing(pty):
+    port, master = pty
+    settings = port.getSettingsDict()
+    with pytest.raises(ValueError):
+        port.applySettingsDict({"baudrate": 57600, "bytesize": 42})
+    assert port.getSettingsDict() == settings
+
+
+def test_non_blocking_partial_write(pty):
+    port, master = pty
+    port.writeTimeout = 0
+    data = b"x" * (1024 * 1024)
+    start = time.time()
+    written = port.write(data)
+    assert 0 < written < len(data)
+    assert time.time() - start < 0.5
+    # Nobody reads the master side, the output stays queued and the port doesn't wait for it forever
+    port.RECONFIGURE_DRAIN_TIMEOUT = 0.05
+    port.baudrate = 57600
+    assert port.baudrate == 57600
+
+
+def test_readline(pty):
+    port, master = pty
+    os.write(master, b"one\ntwo\n")
+    assert port.readline() == b"one\n"
+    assert port.readline() == b"two\n"